@@ -0,0 +1,607 @@
+from chess_game_state import GameState
+from move import (
+    PIECE_NAMES,
+    PIECE_CODES,
+    ENPASSANT_FLAG,
+    CASTLE_FLAG,
+    WKS,
+    BKS,
+    WQS,
+    BQS,
+    pack_move,
+)
+
+# Bitboards are python ints with one bit per square: bit (row * 8 + col), so bit 0 is the top
+# left square (col 0, row 0) and bit 63 the bottom right (col 7, row 7), the same orientation as
+# GameState.board.
+PIECES = ["wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK"]
+PIECE_KEYS = {color: tuple(color + piece for piece in "pNBRQK") for color in "wb"}
+FULL_BOARD = (1 << 64) - 1
+NOT_COL_0 = FULL_BOARD ^ sum(1 << (row * 8) for row in range(8))
+NOT_COL_7 = FULL_BOARD ^ sum(1 << (row * 8 + 7) for row in range(8))
+PROMOTION_ROWS = 0xFF | 0xFF << 56  # row 0 and row 7
+# the row a pawn reaches with its first single push, from which it can push again
+DOUBLE_PUSH_ROWS = {"w": 0xFF << 40, "b": 0xFF << 16}
+CAPTURES = 1  # move generation stages, see BitboardGameState.generate_moves
+QUIETS = 2
+
+
+def _on_board(col, row):
+    return 0 <= col < 8 and 0 <= row < 8
+
+
+def _step_attacks(offsets):
+    """
+    Attack table for a piece that moves one step by each (col, row) offset, indexed by square.
+    """
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        attacks = 0
+        for d_col, d_row in offsets:
+            if _on_board(col + d_col, row + d_row):
+                attacks |= 1 << ((row + d_row) * 8 + col + d_col)
+        table.append(attacks)
+    return table
+
+
+def _ray(sq, d_col, d_row):
+    """
+    All squares from sq (exclusive) to the edge of the board in direction (d_col, d_row).
+    """
+    row, col = divmod(sq, 8)
+    ray = 0
+    col, row = col + d_col, row + d_row
+    while _on_board(col, row):
+        ray |= 1 << (row * 8 + col)
+        col, row = col + d_col, row + d_row
+    return ray
+
+
+KNIGHT_ATTACKS = _step_attacks(
+    ((-1, -2), (-2, -1), (-2, 1), (-1, 2), (1, 2), (2, 1), (2, -1), (1, -2))
+)
+KING_ATTACKS = _step_attacks(
+    ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1))
+)
+PAWN_ATTACKS = {
+    "w": _step_attacks(((-1, -1), (1, -1))),  # white pawns capture up the board
+    "b": _step_attacks(((-1, 1), (1, 1))),
+}
+
+# (rays indexed by square, direction increases the square index).  The first blocker on a ray
+# is its lowest set bit if the ray runs towards higher squares, else its highest set bit.
+ROOK_DIRECTIONS = [
+    ([_ray(sq, d_col, d_row) for sq in range(64)], d_row * 8 + d_col > 0)
+    for d_col, d_row in ((-1, 0), (1, 0), (0, -1), (0, 1))
+]
+BISHOP_DIRECTIONS = [
+    ([_ray(sq, d_col, d_row) for sq in range(64)], d_row * 8 + d_col > 0)
+    for d_col, d_row in ((-1, -1), (1, -1), (-1, 1), (1, 1))
+]
+ROOK_RAYS = [sum(rays[sq] for rays, positive in ROOK_DIRECTIONS) for sq in range(64)]
+BISHOP_RAYS = [
+    sum(rays[sq] for rays, positive in BISHOP_DIRECTIONS) for sq in range(64)
+]
+
+
+def _lines():
+    """
+    BETWEEN[a][b]: squares strictly between a and b.  LINE[a][b]: the whole line through a and b.
+    Both are 0 if a and b aren't on the same rank, file or diagonal.
+    """
+    between = [[0] * 64 for sq in range(64)]
+    line = [[0] * 64 for sq in range(64)]
+    for a in range(64):
+        for d_col, d_row in (
+            (-1, 0),
+            (1, 0),
+            (0, -1),
+            (0, 1),
+            (-1, -1),
+            (1, -1),
+            (-1, 1),
+            (1, 1),
+        ):
+            full_line = _ray(a, d_col, d_row) | _ray(a, -d_col, -d_row) | 1 << a
+            row, col = divmod(a, 8)
+            squares_between = 0
+            col, row = col + d_col, row + d_row
+            while _on_board(col, row):
+                b = row * 8 + col
+                between[a][b] = squares_between
+                line[a][b] = full_line
+                squares_between |= 1 << b
+                col, row = col + d_col, row + d_row
+    return between, line
+
+
+BETWEEN, LINE = _lines()
+
+
+def sliding_attacks(sq, occupied, directions):
+    """
+    Squares attacked from sq along the given directions, stopping at (and including) the first
+    occupied square on each ray.
+    """
+    attacks = 0
+    for rays, positive in directions:
+        ray = rays[sq]
+        blockers = ray & occupied
+        if blockers:
+            if positive:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= rays[blocker]
+        attacks |= ray
+    return attacks
+
+
+def shift(bitboard, step):
+    """
+    bitboard with every square moved step squares up the square numbering, down if step < 0.
+    """
+    return bitboard << step & FULL_BOARD if step > 0 else bitboard >> -step
+
+
+def _relevant_squares(directions):
+    """
+    Per square, the squares whose occupancy changes its attacks along the directions: the rays
+    without their last square, as a piece on the edge of the board doesn't block anything.
+    """
+    masks = []
+    for sq in range(64):
+        mask = 0
+        for rays, positive in directions:
+            ray = rays[sq]
+            if ray:
+                mask |= ray ^ (1 << (ray.bit_length() - 1) if positive else ray & -ray)
+        masks.append(mask)
+    return masks
+
+
+ROOK_MASKS = _relevant_squares(ROOK_DIRECTIONS)
+BISHOP_MASKS = _relevant_squares(BISHOP_DIRECTIONS)
+# per square, attacks by the relevant occupied squares, filled in as occupancies come up (at most
+# 4096 per square for a rook, 512 for a bishop)
+ROOK_TABLES = [{} for sq in range(64)]
+BISHOP_TABLES = [{} for sq in range(64)]
+
+
+def rook_attacks(sq, occupied):
+    """
+    sliding_attacks along the rook directions, looked up rather than walked along the rays.
+    """
+    blockers = occupied & ROOK_MASKS[sq]
+    attacks = ROOK_TABLES[sq].get(blockers)
+    if attacks is None:
+        attacks = sliding_attacks(sq, blockers, ROOK_DIRECTIONS)
+        ROOK_TABLES[sq][blockers] = attacks
+    return attacks
+
+
+def bishop_attacks(sq, occupied):
+    """
+    sliding_attacks along the bishop directions, looked up rather than walked along the rays.
+    """
+    blockers = occupied & BISHOP_MASKS[sq]
+    attacks = BISHOP_TABLES[sq].get(blockers)
+    if attacks is None:
+        attacks = sliding_attacks(sq, blockers, BISHOP_DIRECTIONS)
+        BISHOP_TABLES[sq][blockers] = attacks
+    return attacks
+
+
+class BitboardGameState(GameState):
+    """
+    GameState that generates moves from bitboards: one 64-bit int per piece type and colour plus
+    one per colour.  The board list, logs and all other GameState data are still kept, so it can be
+    used anywhere a GameState is.  Only move generation and attack detection are replaced.
+    Keeping both means make_move updates the board twice, but make/undo is about a tenth of perft
+    time: move generation, bit by bit in python, is the rest.
+    """
+
+    def set_bitboards_from_board(self):
+        """
+        (Re)builds the bitboards from self.board.
+        """
+        self.bitboards = {piece: 0 for piece in PIECES}
+        self.occupancy = {"w": 0, "b": 0}
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    self.bitboards[piece] |= 1 << (row * 8 + col)
+                    self.occupancy[piece[0]] |= 1 << (row * 8 + col)
+
+    def load_fen(self, fen):
+        super().load_fen(fen)
+        self.set_bitboards_from_board()
+
+    def make_move(self, move):
+        self.xor_move(move)
+        super().make_move(move)
+
+    def undo_move(self):
+        if len(self.move_log) != 0:
+            self.xor_move(self.move_log[-1])
+            super().undo_move()
+
+    def xor_move(self, move):
+        """
+        Applies a packed move to the bitboards.  XOR is its own inverse, so the same call undoes it.
+        """
+        bitboards, occupancy = self.bitboards, self.occupancy
+        start_sq, end_sq = move & 63, move >> 6 & 63
+        start, end = 1 << start_sq, 1 << end_sq
+        piece_moved = PIECE_NAMES[move >> 12 & 15]
+        color = piece_moved[0]
+        if move >> 20 & 15:  # promotion
+            bitboards[piece_moved] ^= start
+            bitboards[PIECE_NAMES[move >> 20 & 15]] ^= end
+        else:
+            bitboards[piece_moved] ^= start | end
+        occupancy[color] ^= start | end
+
+        if move >> 16 & 15:  # capture
+            piece_captured = PIECE_NAMES[move >> 16 & 15]
+            if move & ENPASSANT_FLAG:
+                end = 1 << ((start_sq & ~7) | (end_sq & 7))
+            bitboards[piece_captured] ^= end
+            occupancy[piece_captured[0]] ^= end
+
+        if move & CASTLE_FLAG:
+            row_start = end_sq & ~7
+            if end_sq & 7 == 6:  # kingside: rook from col 7 to col 5
+                rook_squares = 1 << (row_start + 7) | 1 << (row_start + 5)
+            else:  # queenside: rook from col 0 to col 3
+                rook_squares = 1 << row_start | 1 << (row_start + 3)
+            bitboards[color + "R"] ^= rook_squares
+            occupancy[color] ^= rook_squares
+
+    def has_non_pawn_material(self, color):
+        bitboards = self.bitboards
+        return (
+            bitboards[color + "N"]
+            | bitboards[color + "B"]
+            | bitboards[color + "R"]
+            | bitboards[color + "Q"]
+        ) != 0
+
+    def attackers_to(self, sq, color, occupied):
+        """
+        Bitboard of the pieces of color attacking sq, given the occupied squares.
+        """
+        bitboards = self.bitboards
+        pawn, knight, bishop, rook, queen, king = PIECE_KEYS[color]
+        return (
+            (KNIGHT_ATTACKS[sq] & bitboards[knight])
+            | (KING_ATTACKS[sq] & bitboards[king])
+            | (PAWN_ATTACKS["b" if color == "w" else "w"][sq] & bitboards[pawn])
+            | (rook_attacks(sq, occupied) & (bitboards[rook] | bitboards[queen]))
+            | (bishop_attacks(sq, occupied) & (bitboards[bishop] | bitboards[queen]))
+        )
+
+    def square_under_attack(self, r, c):
+        """
+        Determine if the enemy can attack the square r, c.  Returns True, False
+        """
+        enemy_color = "b" if self.white_to_move else "w"
+        occupied = self.occupancy["w"] | self.occupancy["b"]
+        return self.attackers_to(r * 8 + c, enemy_color, occupied) != 0
+
+    def compute_attacked_squares(self, color):
+        """
+        Squares color attacks, including squares of its own pieces (which it defends).  The other
+        king doesn't block sliders, so it can't step back along the line of a slider checking it.
+        """
+        bitboards = self.bitboards
+        pawn, knight, bishop, rook, queen, king = PIECE_KEYS[color]
+        occupied = (self.occupancy["w"] | self.occupancy["b"]) ^ bitboards[
+            ("b" if color == "w" else "w") + "K"
+        ]
+        pawns = bitboards[pawn]
+        if color == "w":  # up the board: col - 1 is square - 9, col + 1 is square - 7
+            attacks = (pawns & NOT_COL_0) >> 9 | (pawns & NOT_COL_7) >> 7
+        else:
+            attacks = ((pawns & NOT_COL_0) << 7 | (pawns & NOT_COL_7) << 9) & FULL_BOARD
+        attacks |= KING_ATTACKS[bitboards[king].bit_length() - 1]
+        knights = bitboards[knight]
+        while knights:
+            bit = knights & -knights
+            knights ^= bit
+            attacks |= KNIGHT_ATTACKS[bit.bit_length() - 1]
+        for pieces, slider_attacks in (
+            (bitboards[rook] | bitboards[queen], rook_attacks),
+            (bitboards[bishop] | bitboards[queen], bishop_attacks),
+        ):
+            while pieces:
+                bit = pieces & -pieces
+                pieces ^= bit
+                attacks |= slider_attacks(bit.bit_length() - 1, occupied)
+        return attacks
+
+    def get_valid_moves(self):
+        """
+        All legal moves.  Works out the checkers and pinned pieces once, then generates only moves
+        that are legal, instead of generating everything and filtering.
+        """
+        return next(self.generate_moves((CAPTURES | QUIETS,)))
+
+    def get_staged_moves(self):
+        """
+        The legal moves in two lists, captures and promotions then quiet moves.  The quiet moves
+        are only generated once the second list is asked for, with the position back as it was.
+        """
+        return self.generate_moves((CAPTURES, QUIETS))
+
+    def generate_moves(self, stages):
+        """
+        Generator of one list of legal moves per stage, each stage a mix of CAPTURES (captures and
+        promotions, en passant included) and QUIETS (the other moves, castling included).
+        """
+        board, bitboards = self.board, self.bitboards
+        if self.white_to_move:
+            ally_color, enemy_color = "w", "b"
+        else:
+            ally_color, enemy_color = "b", "w"
+        own = self.occupancy[ally_color]
+        enemy = self.occupancy[enemy_color]
+        occupied = own | enemy
+        empty = ~occupied & FULL_BOARD
+        king = bitboards[ally_color + "K"]
+        king_sq = king.bit_length() - 1
+
+        checkers = self.attackers_to(king_sq, enemy_color, occupied)
+        self.in_check = checkers != 0
+        # king moves: to any square the enemy doesn't attack
+        attacked = self.attacked_squares(enemy_color)
+
+        if checkers:  # capture the checker or block the check
+            checker_sq = checkers.bit_length() - 1
+            target_mask = checkers | BETWEEN[king_sq][checker_sq]
+        else:
+            target_mask = FULL_BOARD
+
+        # pinned pieces may only move along the line between the king and the pinning piece
+        pin_lines = {}
+        enemy_rooks = bitboards[enemy_color + "R"] | bitboards[enemy_color + "Q"]
+        enemy_bishops = bitboards[enemy_color + "B"] | bitboards[enemy_color + "Q"]
+        snipers = (ROOK_RAYS[king_sq] & enemy_rooks) | (
+            BISHOP_RAYS[king_sq] & enemy_bishops
+        )
+        while snipers:
+            bit = snipers & -snipers
+            snipers ^= bit
+            sniper_sq = bit.bit_length() - 1
+            blockers = BETWEEN[king_sq][sniper_sq] & occupied
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pin_lines[blockers.bit_length() - 1] = LINE[king_sq][sniper_sq]
+
+        forward = -8 if ally_color == "w" else 8
+        double_push_row = 6 if ally_color == "w" else 1
+        pawn_attacks = PAWN_ATTACKS[ally_color]
+        # unpinned pawns move all at once: shifting them by a step (end square - start square)
+        # gives the end squares of every pawn move of that kind
+        pawns = bitboards[ally_color + "p"]
+        pinned_pawns = sum(1 << sq for sq in pin_lines if pawns >> sq & 1)
+        free_pawns = pawns ^ pinned_pawns
+        single_pushes = shift(free_pawns, forward) & empty
+        double_pushes = (
+            shift(single_pushes & DOUBLE_PUSH_ROWS[ally_color], forward) & empty
+        )
+        # (end squares, step, captures)
+        pawn_moves = (
+            (single_pushes, forward, False),
+            (double_pushes, 2 * forward, False),
+            (shift(free_pawns & NOT_COL_0, forward - 1) & enemy, forward - 1, True),
+            (shift(free_pawns & NOT_COL_7, forward + 1) & enemy, forward + 1, True),
+        )
+        enpassant_bit = 0
+        if self.enpassant_possible != ():
+            enpassant_bit = 1 << (
+                self.enpassant_possible[1] * 8 + self.enpassant_possible[0]
+            )
+
+        # moves are packed here (see move.py) rather than with pack_move: the piece moved is known,
+        # and only captures need the board to look up the piece captured
+        piece_codes = PIECE_CODES
+        king_move = king_sq | piece_codes[ally_color + "K"] << 12
+        pawn_code = piece_codes[ally_color + "p"] << 12
+        queen_promotion = piece_codes[ally_color + "Q"] << 20
+
+        for stage in stages:
+            moves = []
+            stage_targets = (enemy if stage & CAPTURES else 0) | (
+                empty if stage & QUIETS else 0
+            )
+            # pawn pushes to the last row are promotions, in the CAPTURES stage
+            push_targets = (PROMOTION_ROWS if stage & CAPTURES else 0) | (
+                ~PROMOTION_ROWS & FULL_BOARD if stage & QUIETS else 0
+            )
+
+            targets = KING_ATTACKS[king_sq] & stage_targets & ~attacked
+            while targets:
+                bit = targets & -targets
+                targets ^= bit
+                end_sq = bit.bit_length() - 1
+                moves.append(
+                    king_move
+                    | end_sq << 6
+                    | piece_codes[board[end_sq >> 3][end_sq & 7]] << 16
+                )
+
+            if checkers & (checkers - 1):  # double check: only the king can move
+                yield moves
+                continue
+            piece_targets = stage_targets & target_mask
+
+            # knights, bishops, rooks and queens
+            for piece_type in ("N", "B", "R", "Q"):
+                piece_code = piece_codes[ally_color + piece_type] << 12
+                pieces = bitboards[ally_color + piece_type]
+                while pieces:
+                    bit = pieces & -pieces
+                    pieces ^= bit
+                    sq = bit.bit_length() - 1
+                    if piece_type == "N":
+                        if sq in pin_lines:
+                            continue  # a pinned knight can never move
+                        targets = KNIGHT_ATTACKS[sq]
+                    elif piece_type == "B":
+                        targets = bishop_attacks(sq, occupied)
+                    elif piece_type == "R":
+                        targets = rook_attacks(sq, occupied)
+                    else:
+                        targets = rook_attacks(sq, occupied) | bishop_attacks(
+                            sq, occupied
+                        )
+                    targets &= piece_targets
+                    if sq in pin_lines:
+                        targets &= pin_lines[sq]
+                    start = sq | piece_code
+                    captures = targets & enemy
+                    targets ^= captures
+                    while captures:
+                        bit = captures & -captures
+                        captures ^= bit
+                        end_sq = bit.bit_length() - 1
+                        moves.append(
+                            start
+                            | end_sq << 6
+                            | piece_codes[board[end_sq >> 3][end_sq & 7]] << 16
+                        )
+                    while targets:
+                        bit = targets & -targets
+                        targets ^= bit
+                        moves.append(start | (bit.bit_length() - 1) << 6)
+
+            # pawns
+            for ends, step, is_capture in pawn_moves:
+                if is_capture:
+                    if not stage & CAPTURES:
+                        continue
+                    ends &= target_mask
+                else:
+                    ends &= target_mask & push_targets
+                while ends:
+                    end_bit = ends & -ends
+                    ends ^= end_bit
+                    end_sq = end_bit.bit_length() - 1
+                    move = end_sq - step | pawn_code | end_sq << 6
+                    if is_capture:
+                        move |= piece_codes[board[end_sq >> 3][end_sq & 7]] << 16
+                    if end_bit & PROMOTION_ROWS:
+                        move |= queen_promotion
+                    moves.append(move)
+            pinned = pinned_pawns
+            while pinned:  # pinned pawns, one at a time along their pin lines
+                bit = pinned & -pinned
+                pinned ^= bit
+                sq = bit.bit_length() - 1
+                targets = 0
+                one_step = sq + forward
+                if empty >> one_step & 1:
+                    targets |= 1 << one_step
+                    if sq >> 3 == double_push_row and empty >> (one_step + forward) & 1:
+                        targets |= 1 << (one_step + forward)
+                targets &= push_targets
+                if stage & CAPTURES:
+                    targets |= pawn_attacks[sq] & enemy
+                targets &= target_mask & pin_lines[sq]
+                while targets:
+                    target_bit = targets & -targets
+                    targets ^= target_bit
+                    moves.append(pack_move(sq, target_bit.bit_length() - 1, board))
+            if stage & CAPTURES and enpassant_bit:
+                end_sq = enpassant_bit.bit_length() - 1
+                # the pawns that could capture onto the square are where an enemy pawn there attacks
+                capturers = PAWN_ATTACKS[enemy_color][end_sq] & pawns
+                while capturers:
+                    bit = capturers & -capturers
+                    capturers ^= bit
+                    sq = bit.bit_length() - 1
+                    if enpassant_bit & pin_lines.get(sq, FULL_BOARD) and (
+                        self.enpassant_is_legal(
+                            sq, end_sq, king_sq, checkers, enemy_color, occupied
+                        )
+                    ):
+                        moves.append(pack_move(sq, end_sq, board, ENPASSANT_FLAG))
+
+            if stage & QUIETS and not checkers:
+                self.get_bitboard_castle_moves(
+                    king_sq, ally_color, attacked, occupied, moves
+                )
+            yield moves
+
+    def is_legal_move(self, move):
+        """
+        GameState.is_legal_move from the bitboards, without making the move: the king must not be
+        attacked once the piece has moved.
+        """
+        if move & (CASTLE_FLAG | ENPASSANT_FLAG) or not self.is_unblocked_move(move):
+            return False
+        start, end = 1 << (move & 63), 1 << (move >> 6 & 63)
+        if self.white_to_move:
+            ally_color, enemy_color = "w", "b"
+        else:
+            ally_color, enemy_color = "b", "w"
+        occupied = self.occupancy["w"] | self.occupancy["b"]
+        if move >> 12 & 15 == PIECE_CODES[ally_color + "K"]:
+            king_sq, occupied = move >> 6 & 63, occupied ^ start
+        else:
+            king_sq = self.bitboards[ally_color + "K"].bit_length() - 1
+            occupied = occupied ^ start | end
+        # a captured piece doesn't attack
+        return not self.attackers_to(king_sq, enemy_color, occupied) & ~end
+
+    def enpassant_is_legal(
+        self, start_sq, end_sq, king_sq, checkers, enemy_color, occupied
+    ):
+        """
+        En passant removes two pieces from a line at once, so check the king directly: no slider may
+        see the king once both pawns have gone, and any non-slider checker must be the captured pawn.
+        """
+        captured = 1 << ((start_sq & ~7) | (end_sq & 7))
+        bitboards = self.bitboards
+        occupied = occupied ^ (1 << start_sq) ^ (1 << end_sq) ^ captured
+        if rook_attacks(king_sq, occupied) & (
+            bitboards[enemy_color + "R"] | bitboards[enemy_color + "Q"]
+        ):
+            return False
+        if bishop_attacks(king_sq, occupied) & (
+            bitboards[enemy_color + "B"] | bitboards[enemy_color + "Q"]
+        ):
+            return False
+        return not (
+            checkers
+            & (bitboards[enemy_color + "N"] | bitboards[enemy_color + "p"])
+            & ~captured
+        )
+
+    def get_bitboard_castle_moves(self, king_sq, ally_color, attacked, occupied, moves):
+        """
+        Castle moves.  The king must be on its starting square and not in check, the squares between
+        king and rook empty and the squares the king passes over not attacked.
+        """
+        row = 7 if ally_color == "w" else 0
+        if king_sq != row * 8 + 4:
+            return
+        rights = self.castle_rights
+        if ally_color == "w":
+            kingside, queenside = rights & WKS, rights & WQS
+        else:
+            kingside, queenside = rights & BKS, rights & BQS
+        if (
+            kingside
+            and not occupied >> (row * 8 + 5) & 3
+            and not attacked >> (row * 8 + 5) & 3
+        ):
+            moves.append(pack_move(row * 8 + 4, row * 8 + 6, self.board, CASTLE_FLAG))
+        if (
+            queenside
+            and not occupied >> (row * 8 + 1) & 7
+            and not attacked >> (row * 8 + 2) & 3
+        ):
+            moves.append(pack_move(row * 8 + 4, row * 8 + 2, self.board, CASTLE_FLAG))
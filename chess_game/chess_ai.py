@@ -1,64 +1,865 @@
 import random
 import time
+from multiprocessing import Pool, Value
+from move import Move, PIECE_NAMES, NULL_MOVE
+from opening_book import OpeningBook
+from search_profile import SearchProfile, ProfiledGameState
+from tablebase import Tablebases, plies_of
 from piece_scores import *
+from transposition_table import (
+    TranspositionTable,
+    EXACT,
+    LOWER_BOUND,
+    UPPER_BOUND,
+    NO_MOVE,
+)
 
-CHECKMATE = 1000
+CHECKMATE = 1000  # score of mate at the root, less the plies to mate
 STALEMATE = 0
-white_depth = 5
-black_depth = 3
-next_move = None
-counter = 0
+TABLEBASE_WIN = 900  # score of a tablebase win, less the plies to mate from the root
+# scores beyond +-MATE_BOUND are mates or tablebase wins, which count plies from the root
+MATE_BOUND = 500
+NULL_WINDOW = 0.01  # scores closer than this are equal, for null window searches
+MAX_PLY = 64
+worker_searcher = None  # Searcher of a search pool worker
+worker_search_id = None  # search_id of the search the worker's last task belonged to
 
 
-def score_board(gs):
+class Searcher:
     """
-    Score board.  +ve score is good for white, -ve score is good for black.
+    A search engine: its settings, transposition table, move ordering tables and the result of its
+    last search.  The tables are kept from one search to the next, so a Searcher that plays a whole
+    game reuses what it learned on earlier moves.  Searchers share nothing, so several can search
+    at once in threads or processes.
+
+    The class attributes below are the default settings.  Override them per Searcher, with keyword
+    arguments or by setting the attribute: Searcher(white_depth=4, use_quiescence=False).
     """
-    if gs.check_mate:
-        if gs.white_to_move:
-            return -CHECKMATE  # black wins
+
+    # maximum search depth, iterative deepening stops here if time allows
+    white_depth = 5
+    black_depth = 3
+    white_time_limit = 10.0  # seconds per move.  None = no time limit
+    black_time_limit = 5.0
+    max_nodes = None  # node budget per move.  None = no node limit
+    debug_evaluation = False  # True: check the incremental score against a full scan
+    # extend captures and promotions at depth 0 instead of scoring straight away
+    use_quiescence = True
+    # delta pruning: skip captures that can't get within 2 pawns of alpha
+    DELTA_MARGIN = 2
+    # the king is the last piece to capture with in MVV-LVA order
+    KING_ATTACKER_SCORE = 20
+    use_null_move = True  # null move pruning: skip nodes where passing still beats beta
+    NULL_MOVE_REDUCTION = 2
+    # search late quiet moves 1 ply shallower unless they raise alpha
+    use_late_move_reductions = True
+    LMR_FULL_DEPTH_MOVES = 3  # moves searched at full depth before reductions start
+    LMR_MIN_DEPTH = 3
+    # search each iteration in a narrow window around the last score
+    use_aspiration_windows = True
+    ASPIRATION_WINDOW = 0.5  # pawns either side of the last score, widened 4x on a fail
+    # more than 1: find_best_move splits the root moves over a pool of this many processes.  Off by
+    # default: on the bench positions the pool searches more nodes than one process, for no speedup
+    search_processes = 1
+    # called with (depth, score, nodes, seconds, pv) after every iteration instead of printing, see uci.py
+    info_callback = None
+    # path of a Polyglot .bin opening book: positions in it are played from the book, not searched
+    book_file = None
+    # directory of endgame tables (see tablebase.py), probed in the search once few pieces are left
+    tablebase_dir = None
+    # path of a JSON file: each search writes a profile of its nodes and time there (see
+    # search_profile.py).  Profiled searches run in this process and are slower
+    profile_file = None
+
+    def __init__(self, tt_size_mb=64, **settings):
+        for key, value in settings.items():
+            if key not in SETTINGS:
+                raise TypeError(f"unknown search setting {key!r}")
+            setattr(self, key, value)
+        # memory cap for the transposition table, shared out between processes
+        self.tt_size_mb = tt_size_mb
+        self.transposition_table = TranspositionTable(tt_size_mb)
+        # the last 2 quiet moves that caused a beta cutoff at each ply
+        self.killer_moves = [[NO_MOVE, NO_MOVE] for ply in range(MAX_PLY)]
+        # how often quiet moves caused a cutoff, indexed by piece moved and end square
+        self.history_table = [0] * 1024
+        # pv_table[ply]: the best line found from ply, built up from the leaves as moves raise alpha
+        self.pv_table = [[] for ply in range(MAX_PLY + 1)]
+        self.opening_book = None  # the OpeningBook of book_file, opened on first use
+        self.tablebases = None  # the Tablebases of tablebase_dir
+        self.piece_count = 0  # pieces on the board at the current node, kings included
+        self.search_profile = None  # the SearchProfile of the last search, if profiled
+        # the parallel search's process pool, its workers' shared alpha and what it was started with
+        self.search_pool = self.search_pool_alpha = self.search_pool_settings = None
+        # counts parallel searches, so pool workers know a new one has started
+        self.search_id = 0
+        # a pool worker's Value of the best root score found so far, reread during the search
+        self.shared_alpha = None
+
+        # the last search
+        self.best_move = None  # best move of the last completed iteration
+        self.best_score = -CHECKMATE  # its score, for the side to move
+        # best line of the last completed iteration, starting with best_move
+        self.principal_variation = []
+        self.next_move = None  # best root move so far in the current iteration
+        self.counter = 0  # nodes searched
+        self.root_depth = 0  # depth of the current iterative deepening iteration
+        self.stop_time = None
+        self.search_aborted = False
+
+    def get_settings(self):
+        """
+        The settings of this Searcher, as keyword arguments for Searcher().
+        """
+        return {key: getattr(self, key) for key in SETTINGS}
+
+    def set_transposition_table_size(self, size_mb):
+        """
+        Replaces the transposition table with an empty one of size_mb megabytes.
+        """
+        self.tt_size_mb = size_mb
+        self.transposition_table = TranspositionTable(size_mb)
+
+    def new_game(self):
+        """
+        Forgets everything learned in the last game.  The parallel search's pool is stopped, so its
+        workers start the next game with empty tables too.
+        """
+        self.transposition_table.clear()
+        self.clear_move_ordering()
+        self.close_search_pool()
+
+    def stop(self):
+        """
+        Stops a running search, from another thread.  find_best_move returns the best move of the
+        last completed iteration.
+        """
+        self.search_aborted = True  # checked at every node
+
+    def score_board(self, gs):
+        """
+        Score board.  +ve score is good for white, -ve score is good for black.
+        GameState keeps the material + position score up to date in make_move/undo_move, so this is O(1).
+        Checkmate and stalemate are found by the search, which sees there are no moves.
+        """
+        if self.debug_evaluation:
+            full_scan_score = gs.compute_board_score()
+            if abs(full_scan_score - gs.board_score) > 1e-6:
+                raise AssertionError(
+                    f"incremental board_score {gs.board_score} != full scan score {full_scan_score}: {gs.get_fen()}"
+                )
+        return gs.board_score
+
+    def find_best_move(self, gs, valid_moves=None):
+        """
+        Iterative deepening: searches to depth 1, 2, 3... until the max depth, the time limit or the
+        node budget is reached, and returns the best move of the last completed iteration (None if
+        there is none).  best_score and principal_variation hold the rest of the result.
+        Positions in the opening book or the endgame tables aren't searched.
+        """
+        if valid_moves is None:
+            valid_moves = gs.get_valid_moves()
+        self.search_profile = None
+        book_move = self.get_book_move(gs, valid_moves)
+        if book_move is not None:
+            self.best_move, self.best_score = book_move, 0
+            self.principal_variation, self.counter = [book_move], 0
+            if self.info_callback is None:
+                print(f"book move: {Move.from_packed(book_move).move_id}")
+            return book_move
+        self.update_tablebases()
+        self.piece_count = count_pieces(gs)
+        tablebase_result = self.get_tablebase_move(gs, valid_moves)
+        if tablebase_result is not None:
+            self.best_move, self.best_score = tablebase_result
+            self.principal_variation, self.counter = [self.best_move], 0
+            if self.info_callback is None:
+                print(
+                    f"tablebase move: {Move.from_packed(self.best_move).move_id}     score: {self.best_score:.3f}"
+                )
+            return self.best_move
+        if self.profile_file is not None:
+            self.search_profile = SearchProfile(gs, self.transposition_table)
+            gs = ProfiledGameState(gs, self.search_profile)
+            self.score_board = self.search_profile.timed(
+                "score_board", self.score_board
+            )
+        elif self.search_processes > 1:
+            return self.find_best_move_parallel(gs, valid_moves)
+        start_time = time.time()
+        self.next_move, self.counter, self.search_aborted = None, 0, False
+        self.best_move, self.best_score = None, -CHECKMATE
+        self.principal_variation = []
+        self.transposition_table.new_search()
+        self.age_move_ordering()
+        max_depth = self.white_depth if gs.white_to_move else self.black_depth
+        time_limit = (
+            self.white_time_limit if gs.white_to_move else self.black_time_limit
+        )
+        self.stop_time = None if time_limit is None else start_time + time_limit
+        valid_moves.sort(reverse=True, key=lambda move: move_sort_algo(move, gs))
+
+        for depth in range(1, max_depth + 1):
+            self.root_depth = depth
+            if (
+                self.best_move is not None
+            ):  # search the last iteration's best move first
+                valid_moves.remove(self.best_move)
+                valid_moves.insert(0, self.best_move)
+            # alpha = current max, so start lowest;  beta = current min so start hightest
+            alpha, beta = -CHECKMATE, CHECKMATE
+            window = self.ASPIRATION_WINDOW
+            if (
+                self.use_aspiration_windows
+                and depth > 1
+                and abs(self.best_score) < MATE_BOUND
+            ):
+                alpha, beta = self.best_score - window, self.best_score + window
+            while True:
+                score = self.find_move_nega_max_alpha_beta(
+                    gs, valid_moves, depth, alpha, beta, 1 if gs.white_to_move else -1
+                )
+                if self.search_aborted:
+                    break
+                # outside the window the score is only a bound: widen the window and search again
+                if score <= alpha and alpha > -CHECKMATE:
+                    window *= 4
+                    alpha = max(score - window, -CHECKMATE)
+                elif score >= beta and beta < CHECKMATE:
+                    window *= 4
+                    beta = min(score + window, CHECKMATE)
+                else:
+                    break
+            if (
+                self.search_aborted
+            ):  # out of time or nodes: the unfinished iteration can't be trusted
+                break
+            self.best_move, self.best_score = self.next_move, score
+            self.principal_variation = self.pv_table[0]
+            if self.search_profile is not None:
+                self.search_profile.end_iteration(depth, score, self.counter)
+            if self.info_callback is not None:
+                self.info_callback(
+                    depth,
+                    score,
+                    self.counter,
+                    time.time() - start_time,
+                    self.principal_variation,
+                )
+            else:
+                print(
+                    f"depth: {depth}     score: {score:.3f}     nodes: {self.counter}     Time: {time.time() - start_time:.2f}     pv: {' '.join(Move.from_packed(move).move_id for move in self.principal_variation)}"
+                )
+            if abs(self.best_score) >= CHECKMATE - depth:
+                break  # a mate within the depth searched: deeper searches won't find a shorter one
+            if self.stop_time is not None and time.time() > self.stop_time:
+                break
+        end_time = time.time()
+        if self.info_callback is None:
+            print(
+                f"movesSearched: {self.counter}     maxScore: {self.best_score:.3f}     Time: {end_time - start_time:.2f}"
+            )
+        if self.search_profile is not None:
+            del self.score_board  # back to the untimed method
+            self.search_profile.write(
+                self.profile_file,
+                self.counter,
+                (
+                    None
+                    if self.best_move is None
+                    else Move.from_packed(self.best_move).get_uci_notation()
+                ),
+            )
+        return self.best_move
+
+    def get_book_move(self, gs, valid_moves):
+        """
+        A move for the position from the book_file opening book, or None if there is no book or the
+        position isn't in it.
+        """
+        if self.book_file is None:
+            return None
+        if self.opening_book is None or self.opening_book.path != self.book_file:
+            self.opening_book = OpeningBook(self.book_file)
+        return self.opening_book.choose_move(gs, valid_moves)
+
+    def update_tablebases(self):
+        """
+        Opens the tables in tablebase_dir if it has changed.  tablebases is None without tables.
+        """
+        if self.tablebase_dir is None:
+            self.tablebases = None
+        elif self.tablebases is None or self.tablebases.directory != self.tablebase_dir:
+            self.tablebases = Tablebases(self.tablebase_dir)
+
+    def get_tablebase_move(self, gs, valid_moves):
+        """
+        (best move, score) straight from the endgame tables if every move leads to a position in
+        them, otherwise None.
+        """
+        if self.tablebases is None or self.piece_count > self.tablebases.max_pieces:
+            return None
+        best_move, best_score = None, -CHECKMATE
+        for move in valid_moves:
+            gs.make_move(move)
+            value = self.tablebases.probe(gs)
+            gs.undo_move()
+            if value is None:
+                return None
+            score = -tablebase_score(value, 1)
+            if score > best_score:
+                best_move, best_score = move, score
+        return None if best_move is None else (best_move, best_score)
+
+    def find_best_move_parallel(self, gs, valid_moves):
+        """
+        Root split parallel search over search_processes processes, returning the move like find_best_move.
+        Each iteration searches the first (previous best) move on its own to get a good alpha, then
+        hands the other root moves out to the pool.  Workers share the best score found so far and use
+        it as alpha, rereading it as they search, so later root moves are searched with the tightest
+        window known.  There are no aspiration windows, and the node budget is only checked between
+        iterations.
+        The pool is kept from move to move (see get_search_pool), so each worker's Searcher keeps its
+        tables like a single process search does.
+        """
+        start_time = time.time()
+        self.counter, self.search_aborted = 0, False
+        self.best_move, self.best_score = None, -CHECKMATE
+        self.principal_variation = []
+        max_depth = self.white_depth if gs.white_to_move else self.black_depth
+        time_limit = (
+            self.white_time_limit if gs.white_to_move else self.black_time_limit
+        )
+        search_stop_time = None if time_limit is None else start_time + time_limit
+        turn_multiplier = 1 if gs.white_to_move else -1
+        valid_moves.sort(reverse=True, key=lambda move: move_sort_algo(move, gs))
+        pool, shared_alpha = self.get_search_pool()
+        self.search_id += 1
+
+        for depth in range(1, max_depth + 1):
+            if (
+                self.best_move is not None
+            ):  # search the last iteration's best move first
+                valid_moves.remove(self.best_move)
+                valid_moves.insert(0, self.best_move)
+            shared_alpha.value = -CHECKMATE
+            tasks = [
+                (
+                    self.search_id,
+                    gs,
+                    i,
+                    valid_moves[i],
+                    depth,
+                    turn_multiplier,
+                    None if depth == 1 else search_stop_time,
+                )
+                for i in range(len(valid_moves))
+            ]
+            results = [pool.apply(search_root_move, (tasks[0],))]
+            results += pool.imap_unordered(search_root_move, tasks[1:])
+            self.counter += sum(result[2] for result in results)
+            if any(result[1] is None for result in results) or self.search_aborted:
+                break  # out of time: the unfinished iteration can't be trusted
+            # the move that raised the shared alpha last: the others scored no better than it did
+            index, score, nodes, pv, raised_alpha = max(
+                results, key=lambda result: (result[4], result[1], -result[0])
+            )
+            self.best_move, self.best_score = valid_moves[index], score
+            self.principal_variation = pv
+            if self.info_callback is not None:
+                self.info_callback(
+                    depth, score, self.counter, time.time() - start_time, pv
+                )
+            else:
+                print(
+                    f"depth: {depth}     score: {score:.3f}     nodes: {self.counter}     Time: {time.time() - start_time:.2f}     pv: {' '.join(Move.from_packed(move).move_id for move in pv)}"
+                )
+            if abs(self.best_score) >= CHECKMATE - depth:
+                break
+            if search_stop_time is not None and time.time() > search_stop_time:
+                break
+            if self.max_nodes is not None and self.counter >= self.max_nodes:
+                break
+        if self.info_callback is None:
+            print(
+                f"movesSearched: {self.counter}     maxScore: {self.best_score:.3f}     Time: {time.time() - start_time:.2f}     processes: {self.search_processes}"
+            )
+        return self.best_move
+
+    def get_search_pool(self):
+        """
+        (pool, shared alpha Value) for find_best_move_parallel.  The pool is started on first use and
+        kept, so its workers' tables carry over from move to move; it is restarted if
+        search_processes, tt_size_mb or the settings have changed.  Each worker has a Searcher with
+        these settings and a transposition table of tt_size_mb / search_processes megabytes.
+        """
+        settings = dict(
+            self.get_settings(),
+            search_processes=1,
+            info_callback=None,
+            profile_file=None,
+        )
+        pool_settings = (self.search_processes, self.tt_size_mb, settings)
+        if self.search_pool is None or self.search_pool_settings != pool_settings:
+            self.close_search_pool()
+            # one Value per pool, so concurrent Searchers each have their own
+            self.search_pool_alpha = Value("d", -CHECKMATE)
+            self.search_pool = Pool(
+                self.search_processes,
+                initializer=init_search_worker,
+                initargs=(
+                    self.search_pool_alpha,
+                    settings,
+                    self.tt_size_mb / self.search_processes,
+                ),
+            )
+            self.search_pool_settings = pool_settings
+        return self.search_pool, self.search_pool_alpha
+
+    def close_search_pool(self):
+        """
+        Stops the worker processes of the parallel search, if there are any.
+        """
+        if self.search_pool is not None:
+            self.search_pool.terminate()
+            self.search_pool.join()
+        self.search_pool = self.search_pool_alpha = self.search_pool_settings = None
+
+    def out_of_time_or_nodes(self):
+        """
+        True once the time limit or node budget of the search is used up.  Iteration 1 always
+        completes so there is always a move to return.
+        """
+        if self.root_depth <= 1:
+            return False
+        if self.max_nodes is not None and self.counter >= self.max_nodes:
+            return True
+        return self.stop_time is not None and time.time() > self.stop_time
+
+    def find_move_nega_max_alpha_beta(
+        self, gs, valid_moves, depth, alpha, beta, turn_multiplier, ply=0, is_pv=True
+    ):
+        """
+        find_move_nega_max_alpha_beta.  Always find the maximum score for black and white.
+        Alpha = Best score the current player has found so far (starts at -1000)
+        Beta = Best score the opponent has found so far (starts at +1000)
+        When beta < alpha, the maximizing player need not consider further descendants of this node, as opponent player won't let them reach it in real play.
+        ply = distance from the root, which is ply 0.
+        is_pv: a PV node, searched with an open window.  Every other node is searched with a null
+        window; the node type is passed down rather than read from beta - alpha, which float scores
+        make unreliable.
+        """
+        self.counter += 1
+        self.pv_table[ply] = []
+        if self.counter & 1023 == 0 and self.out_of_time_or_nodes():
+            self.search_aborted = True
+        if self.search_aborted:
+            return 0  # the result is thrown away
+        if ply > 0:
+            if gs.is_repetition() or gs.is_fifty_move_draw():
+                return STALEMATE  # a draw
+            # mate distance pruning: no line from here can beat mating on the next move or score
+            # worse than being mated now, so a window outside those bounds is already decided
+            alpha = max(alpha, -CHECKMATE + ply)
+            beta = min(beta, CHECKMATE - ply - 1)
+            if alpha >= beta:
+                return alpha
+        if (
+            self.tablebases is not None
+            and ply > 0
+            and self.piece_count <= self.tablebases.max_pieces
+        ):  # few enough pieces to be in the endgame tables: the exact result, no search needed
+            value = self.tablebases.probe(gs)
+            if value is not None:
+                return tablebase_score(value, ply)
+        if depth == 0:
+            if self.use_quiescence:
+                return self.quiescence_search(gs, alpha, beta, turn_multiplier)
+            return turn_multiplier * self.score_board(gs)
+
+        is_root = ply == 0
+        alpha_original = alpha
+        hash_move = NO_MOVE
+        entry = self.transposition_table.probe(gs.zobrist_key)
+        if entry is not None:
+            entry_depth, flag, entry_score, hash_move = entry
+            entry_score = score_from_table(entry_score, ply)
+            if (
+                entry_depth >= depth and not is_root
+            ):  # the stored search was at least as deep as this one, so use its score
+                if flag == EXACT:
+                    if (
+                        hash_move != NO_MOVE
+                    ):  # the PV stops here, with the stored best move
+                        self.pv_table[ply] = [hash_move]
+                    return entry_score
+                elif flag == LOWER_BOUND:
+                    alpha = max(alpha, entry_score)
+                elif flag == UPPER_BOUND:
+                    beta = min(beta, entry_score)
+                if beta <= alpha:
+                    return entry_score
+
+        in_check = gs.king_in_check()
+        if (
+            self.use_null_move
+            and not is_pv
+            and not in_check
+            and depth > self.NULL_MOVE_REDUCTION
+            # no 2 passes in a row
+            and not (gs.move_log and gs.move_log[-1] == NULL_MOVE)
+            and beta < MATE_BOUND
+            and gs.has_non_pawn_material("w" if gs.white_to_move else "b")  # zugzwang
+            and turn_multiplier * self.score_board(gs) >= beta
+        ):  # if passing the turn still scores >= beta in a shallower search, a real move will too
+            gs.make_null_move()
+            score = -self.find_move_nega_max_alpha_beta(
+                gs,
+                None,
+                depth - 1 - self.NULL_MOVE_REDUCTION,
+                -beta,
+                -beta + NULL_WINDOW,
+                -turn_multiplier,
+                ply + 1,
+                False,
+            )
+            gs.undo_null_move()
+            if self.search_aborted:
+                return 0
+            if score >= beta:
+                # a mate found by passing isn't a real mate
+                return beta if score >= MATE_BOUND else score
+
+        if (
+            valid_moves is None
+        ):  # only generate moves once we know the node has to be searched
+            valid_moves = self.pick_moves(gs, hash_move, ply)
+        elif hash_move != NO_MOVE:  # search the best move from the last visit first
+            for i in range(len(valid_moves)):
+                if valid_moves[i] == hash_move:
+                    valid_moves = (
+                        [valid_moves[i]] + valid_moves[:i] + valid_moves[i + 1 :]
+                    )
+                    break
+
+        max_score = -CHECKMATE  # worst scenario
+        best_move = NO_MOVE
+        for i, move in enumerate(valid_moves):
+            gs.make_move(move)
+            is_capture = move >> 16 & 15 != 0
+            self.piece_count -= is_capture
+            # principal variation search: the first move is expected to be the best
+            if i == 0:
+                score = -self.find_move_nega_max_alpha_beta(
+                    gs,
+                    None,
+                    depth - 1,
+                    -beta,
+                    -alpha,
+                    -turn_multiplier,
+                    ply + 1,
+                    is_pv,
+                )  # switch the alpha beta perspective.
+            else:  # the rest only need to be proved worse than alpha, with a null window search
+                reduction = (
+                    1
+                    if self.use_late_move_reductions
+                    and i >= self.LMR_FULL_DEPTH_MOVES
+                    and depth >= self.LMR_MIN_DEPTH
+                    and not is_root
+                    and not in_check
+                    and not move >> 16 & 0xFF  # quiet: not a capture or promotion
+                    and move not in self.killer_moves[ply]
+                    and not gs.king_in_check()  # doesn't give check
+                    else 0
+                )  # a late quiet move is probably bad: prove it with a shallower search
+                score = -self.find_move_nega_max_alpha_beta(
+                    gs,
+                    None,
+                    depth - 1 - reduction,
+                    -alpha - NULL_WINDOW,
+                    -alpha,
+                    -turn_multiplier,
+                    ply + 1,
+                    False,
+                )
+                if score > alpha and reduction:  # it wasn't, try the full depth
+                    score = -self.find_move_nega_max_alpha_beta(
+                        gs,
+                        None,
+                        depth - 1,
+                        -alpha - NULL_WINDOW,
+                        -alpha,
+                        -turn_multiplier,
+                        ply + 1,
+                        False,
+                    )
+                # better than the best move so far: get its exact score
+                if is_pv and alpha < score < beta:
+                    score = -self.find_move_nega_max_alpha_beta(
+                        gs, None, depth - 1, -beta, -alpha, -turn_multiplier, ply + 1
+                    )
+            gs.undo_move()
+            self.piece_count += is_capture
+            if self.search_aborted:
+                return 0
+            if score > max_score:
+                max_score = score
+                best_move = move
+                if score > alpha:  # a new best line from this node
+                    self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+                if is_root:
+                    self.next_move = move
+
+            alpha = max(max_score, alpha)  # pruning
+            if ply == 1 and self.shared_alpha is not None:
+                # a pool worker: another worker may have raised the root alpha since this started
+                beta = min(beta, -self.shared_alpha.value)
+                if max_score < beta <= alpha:
+                    return alpha  # a bound from the window, not from this node, so not stored
+            if (
+                beta <= alpha
+            ):  # we can stop searching here because opponent has already found a position limiting us to beta so will never let us reach this position in real play.
+                if self.search_profile is not None:
+                    self.search_profile.beta_cutoff(i)
+                if not move >> 16 & 0xFF:  # a quiet move: try it early in sibling nodes
+                    self.store_cutoff_move(move, ply, depth)
+                break
+
+        if best_move == NO_MOVE:  # no legal moves: checkmate or stalemate
+            return -CHECKMATE + ply if in_check else STALEMATE
+        if max_score <= alpha_original:
+            flag = UPPER_BOUND  # no move raised alpha, the real score may be lower
+        elif max_score >= beta:
+            flag = LOWER_BOUND  # cut off, the real score may be higher
+        else:
+            flag = EXACT
+        self.transposition_table.store(
+            gs.zobrist_key, depth, flag, score_to_table(max_score, ply), best_move
+        )
+        return max_score
+
+    def clear_move_ordering(self):
+        """
+        Forgets the killer moves and history scores.
+        """
+        for killers in self.killer_moves:
+            killers[0] = killers[1] = NO_MOVE
+        for i in range(len(self.history_table)):
+            self.history_table[i] = 0
+
+    def age_move_ordering(self):
+        """
+        Start of a search: the killer moves were for other plies of the game, so forget them, but
+        only halve the history scores, which are still a good guide a move later.
+        """
+        for killers in self.killer_moves:
+            killers[0] = killers[1] = NO_MOVE
+        for i in range(len(self.history_table)):
+            self.history_table[i] >>= 1
+
+    def pick_moves(self, gs, hash_move, ply):
+        """
+        Staged move picker for nodes below the root, a generator: the hash move, then captures and
+        promotions by MVV-LVA, then the killer moves of this ply, then the other quiet moves by
+        history score.  Each stage is only generated once the moves before it have been searched,
+        so a cutoff by the hash move or a capture never generates the quiet moves.
+        """
+        if hash_move != NO_MOVE and gs.is_legal_move(hash_move):
+            yield hash_move
         else:
-            return CHECKMATE  # white wins
-    elif gs.stale_mate:
+            hash_move = NO_MOVE  # not searched yet, so it comes in its stage
+        stages = gs.get_staged_moves()
+        captures = next(stages)
+        king_attacker_score = self.KING_ATTACKER_SCORE
+        captures.sort(key=lambda move: mvv_lva(move, king_attacker_score), reverse=True)
+        for move in captures:
+            if move != hash_move:
+                yield move
+        killers = [
+            killer
+            for killer in self.killer_moves[ply]
+            if killer != NO_MOVE and killer != hash_move and gs.is_legal_move(killer)
+        ]
+        for move in killers:
+            yield move
+        quiet_moves = next(stages)
+        history_table = self.history_table
+        # end square and piece moved
+        quiet_moves.sort(key=lambda move: history_table[move >> 6 & 1023], reverse=True)
+        for move in quiet_moves:
+            if move != hash_move and move not in killers:
+                yield move
+
+    def store_cutoff_move(self, move, ply, depth):
+        """
+        Records a quiet move that caused a beta cutoff as a killer for its ply and in the history table.
+        Deeper cutoffs count for more.
+        """
+        killers = self.killer_moves[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history_table[move >> 6 & 1023] += depth * depth
+
+    def quiescence_search(self, gs, alpha, beta, turn_multiplier):
+        """
+        Searches only captures and promotions until the position is quiet, so a leaf is never scored in
+        the middle of an exchange (the horizon effect).
+        Stand pat: the side to move doesn't have to capture, so the static score is a lower bound.
+        Delta pruning: skip captures that can't raise the score to alpha even with DELTA_MARGIN to spare.
+        """
+        self.counter += 1
+        if self.counter & 1023 == 0 and self.out_of_time_or_nodes():
+            self.search_aborted = True
+        if self.search_aborted:
+            return 0
+
+        stand_pat = turn_multiplier * self.score_board(gs)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat + piece_score["Q"] + self.DELTA_MARGIN < alpha:
+            return stand_pat  # not even winning a queen gets back to alpha
+        alpha = max(alpha, stand_pat)
+
+        captures = next(gs.get_staged_moves())  # captures and promotions
+        captures.sort(
+            key=lambda move: mvv_lva(move, self.KING_ATTACKER_SCORE), reverse=True
+        )
+        max_score = stand_pat
+        for move in captures:
+            gain = (
+                piece_score[PIECE_NAMES[move >> 16 & 15][1]] if move >> 16 & 15 else 0
+            )
+            if move >> 20 & 15:
+                gain += piece_score["Q"] - piece_score["p"]
+            if stand_pat + gain + self.DELTA_MARGIN < alpha:
+                continue
+            gs.make_move(move)
+            score = -self.quiescence_search(gs, -beta, -alpha, -turn_multiplier)
+            gs.undo_move()
+            if self.search_aborted:
+                return 0
+            if score > max_score:
+                max_score = score
+                alpha = max(alpha, score)
+                if beta <= alpha:
+                    break
+        return max_score
+
+
+# the settings a Searcher can be given: the non-method class attributes
+SETTINGS = tuple(
+    key
+    for key, value in vars(Searcher).items()
+    if not key.startswith("_") and not callable(value)
+)
+
+
+def search_process(requests, results):
+    """
+    Process target for chess_main: one Searcher answers every (gs, valid_moves) request on the
+    requests queue, so its tables carry over from move to move of the game.  None stops it.
+    """
+    searcher = Searcher()
+    for gs, valid_moves in iter(requests.get, None):
+        results.put(searcher.find_best_move(gs, valid_moves))
+    searcher.close_search_pool()
+
+
+def init_search_worker(alpha, settings, size_mb):
+    """
+    Pool initializer: every worker keeps its own Searcher for the life of the pool.
+    """
+    global worker_searcher, worker_search_id
+    worker_searcher = Searcher(size_mb, **settings)
+    worker_searcher.shared_alpha = alpha
+    worker_searcher.update_tablebases()
+    worker_search_id = None
+
+
+def search_root_move(task):
+    """
+    Pool task: searches one root move, using the best root score found by any worker as alpha.
+    Returns (move index, score, nodes, principal variation, whether the score raised the shared
+    alpha), with score None if the search ran out of time.  A score that didn't raise the shared
+    alpha is only an upper bound, which is fine: that move isn't the best.
+    """
+    global worker_search_id
+    search_id, gs, index, move, depth, turn_multiplier, stop_time = task
+    searcher = worker_searcher
+    if search_id != worker_search_id:  # the first task of a new search in this worker
+        worker_search_id = search_id
+        searcher.transposition_table.new_search()
+        searcher.age_move_ordering()
+    searcher.counter, searcher.search_aborted = 0, False
+    searcher.root_depth, searcher.stop_time = depth, stop_time
+    shared_alpha = searcher.shared_alpha
+    gs.make_move(move)
+    searcher.piece_count = count_pieces(gs)
+    score = -searcher.find_move_nega_max_alpha_beta(
+        gs, None, depth - 1, -CHECKMATE, -shared_alpha.value, -turn_multiplier, 1
+    )
+    gs.undo_move()
+    if searcher.search_aborted:
+        return index, None, searcher.counter, [], False
+    with shared_alpha.get_lock():
+        raised_alpha = score > shared_alpha.value
+        if raised_alpha:
+            shared_alpha.value = score
+    return index, score, searcher.counter, [move] + searcher.pv_table[1], raised_alpha
+
+
+def count_pieces(gs):
+    return sum(square != "--" for row in gs.board for square in row)
+
+
+def tablebase_score(value, ply):
+    """
+    Search score for the side to move, ply plies from the root, of an endgame table value: wins and
+    losses count the plies to mate from the root, like mate scores.
+    """
+    plies = plies_of(value)
+    if plies is None:
         return STALEMATE
-    score = 0
-    for row in range(len(gs.board)):
-        for col in range(len(gs.board[row])):
-            square = gs.board[row][col]
-            color = square[0]
-            piece = square[1]
-            if square != "--":
-                piece_position_score = piece_position_scores[square][row][col]
-                if color == "w":
-                    score += piece_score[piece] + piece_position_score * 0.1
-                elif color == "b":
-                    score -= piece_score[piece] + piece_position_score * 0.1
+    if plies > 0:
+        return TABLEBASE_WIN - ply - plies
+    return -TABLEBASE_WIN + ply - plies
+
+
+def score_to_table(score, ply):
+    """
+    Mate and tablebase scores count plies from the root, but the transposition table can find a
+    position at any ply, so it stores them counting from the position itself.
+    """
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
     return score
 
 
-def find_best_move(gs, validMoves, returnQueue):
-    """
-    The function that is called by chess_main
-    """
-    global next_move, counter, white_depth, black_depth
-    start_time = time.time()
-    next_move, counter = None, 0
-    depth = white_depth if gs.white_to_move else black_depth
-    validMoves.sort(reverse=True, key=lambda move: move_sort_algo(move, gs))
-    best_score = find_move_nega_max_alpha_beta(
-        gs,
-        validMoves,
-        depth,
-        -CHECKMATE,
-        CHECKMATE,
-        1 if gs.white_to_move else -1,
-        True if gs.white_to_move else False,
-    )  # alpha = current max, so start lowest;  beta = current min so start hightest
-    end_time = time.time()
-    print(
-        f"movesSearched: {counter}     maxScore: {best_score:.3f}     Time: {end_time - start_time:.2f}"
-    )
-    returnQueue.put(next_move)
+def score_from_table(score, ply):
+    """
+    The inverse of score_to_table, for a position ply plies from the root.
+    """
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def mate_plies(score):
+    """
+    Plies from the root to the mate a mate or tablebase score leads to, negative if the side to
+    move is mated, or None for any other score.
+    """
+    if score > MATE_BOUND:
+        return round((CHECKMATE if score > TABLEBASE_WIN else TABLEBASE_WIN) - score)
+    if score < -MATE_BOUND:
+        return round(-(CHECKMATE if score < -TABLEBASE_WIN else TABLEBASE_WIN) - score)
+    return None
 
 
 def move_sort_algo(move, game_state):
@@ -67,67 +868,44 @@ def move_sort_algo(move, game_state):
     Likely strongest moves should be searched first for better pruning efficiency
     """
     score = 0
+    end_row, end_col = move >> 9 & 7, move >> 6 & 7
+    piece_moved = PIECE_NAMES[move >> 12 & 15]
+    piece_captured = PIECE_NAMES[move >> 16 & 15]
 
-    if move.piece_captured != "--":
-        score += (
-            10 * piece_score[move.piece_captured[1]] - piece_score[move.piece_moved[1]]
-        )
+    if piece_captured != "--":
+        score += 10 * piece_score[piece_captured[1]] - piece_score[piece_moved[1]]
 
-    if game_state.square_under_attack(move.end_row, move.end_col):
-        if move.piece_captured == "--":
-            score -= piece_score[move.piece_moved[1]]  # if a capture, already handled
+    attacked = game_state.attacked_squares("b" if game_state.white_to_move else "w")
+    if attacked >> (move >> 6 & 63) & 1:  # end square attacked
+        if piece_captured == "--":
+            score -= piece_score[piece_moved[1]]  # if a capture, already handled
 
-    if move.piece_captured == "--" and game_state.square_under_attack(
-        move.start_row, move.start_col
-    ):
-        score += piece_score[move.piece_moved[1]] * 0.5
+    if piece_captured == "--" and attacked >> (move & 63) & 1:  # moving out of attack
+        score += piece_score[piece_moved[1]] * 0.5
 
-    if move.is_pawn_promotion:
-        score += piece_score["Q"] - piece_score["P"]
+    if move >> 20 & 15:  # pawn promotion
+        score += piece_score["Q"] - piece_score["p"]
 
-    if move.piece_captured == "--":
-        center_distance = abs(3.5 - move.end_row) + abs(3.5 - move.end_col)
+    if piece_captured == "--":
+        center_distance = abs(3.5 - end_row) + abs(3.5 - end_col)
         score += (7 - center_distance) * 0.1
 
     return score
 
 
-def find_move_nega_max_alpha_beta(
-    gs, valid_moves, depth, alpha, beta, turn_multiplier, white_ai
-):
-    """
-    find_move_nega_max_alpha_beta.  Always find the maximum score for black and white.
-    Alpha = Best score the current player has found so far (starts at -1000)
-    Beta = Best score the opponent has found so far (starts at +1000)
-    When beta < alpha, the maximizing player need not consider further descendants of this node, as opponent player won't let them reach it in real play.
-    """
-    global next_move, counter, white_depth, black_depth
-    counter += 1
-    if depth == 0:
-        return turn_multiplier * score_board(gs)
-
-    max_score = -CHECKMATE  # worst scenario
-    for move in valid_moves:
-        gs.make_move(move)
-        next_moves = gs.get_valid_moves()
-        score = -find_move_nega_max_alpha_beta(
-            gs, next_moves, depth - 1, -beta, -alpha, -turn_multiplier, white_ai
-        )  # switch the alpha beta perspective.
-        if score > max_score:
-            max_score = score
-            if (depth == white_depth and white_ai) or (
-                depth == black_depth and not white_ai
-            ):
-                next_move = move
-                print(next_move.move_id, f"{max_score:.3f}")
-        gs.undo_move()
-
-        alpha = max(max_score, alpha)  # pruning
-        if (
-            beta <= alpha
-        ):  # we can stop searching here because opponent has already found a position limiting us to beta so will never let us reach this position in real play.
-            break
-    return max_score
+def mvv_lva(move, king_attacker_score=Searcher.KING_ATTACKER_SCORE):
+    """
+    Most Valuable Victim - Least Valuable Attacker: take the biggest piece with the smallest piece first.
+    """
+    score = 0
+    if move >> 16 & 15:
+        score += 10 * piece_score[PIECE_NAMES[move >> 16 & 15][1]]
+    if move >> 20 & 15:
+        score += 10 * (piece_score["Q"] - piece_score["p"])
+    piece_moved = PIECE_NAMES[move >> 12 & 15]
+    if piece_moved[1] == "K":
+        return score - king_attacker_score
+    return score - piece_score[piece_moved[1]]
 
 
 def find_random_move(valid_moves):
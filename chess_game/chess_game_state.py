@@ -1,4 +1,36 @@
-from move import Move, CastleRights
+from move import (
+    CastleRights,
+    CASTLE_RIGHTS_KEPT,
+    WKS,
+    BKS,
+    WQS,
+    BQS,
+    PIECE_NAMES,
+    ENPASSANT_FLAG,
+    CASTLE_FLAG,
+    NULL_MOVE,
+    pack_move,
+)
+from fen import START_FEN, parse_fen, to_fen
+from piece_scores import piece_square_scores
+from zobrist import (
+    piece_keys,
+    enpassant_keys,
+    castle_rights_keys,
+    black_to_move_key,
+    hash_position,
+)
+
+# (col, row) directions for attacked_squares
+STEP_DIRECTIONS = {
+    "N": ((-1, -2), (-2, -1), (-2, 1), (-1, 2), (1, 2), (2, 1), (2, -1), (1, -2)),
+    "K": ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1)),
+}
+SLIDER_DIRECTIONS = {
+    "R": ((-1, 0), (1, 0), (0, -1), (0, 1)),
+    "B": ((-1, -1), (1, -1), (-1, 1), (1, 1)),
+}
+SLIDER_DIRECTIONS["Q"] = SLIDER_DIRECTIONS["R"] + SLIDER_DIRECTIONS["B"]
 
 
 class GameState:
@@ -8,18 +40,9 @@ class GameState:
     moves at the current state.  It will also keep a move log.
     """
 
-    def __init__(self):
-        self.board = [
-            ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
-            ["bp", "bp", "bp", "bp", "bp", "bp", "bp", "bp"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["wp", "wp", "wp", "wp", "wp", "wp", "wp", "wp"],
-            ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"],
-        ]
-
+    def __init__(self, fen=START_FEN, scores=None):
+        # material + position tables, piece_scores.piece_square_scores unless given others
+        self.piece_square_scores = piece_square_scores if scores is None else scores
         self.move_functions = {
             "p": self.get_pawn_moves,
             "R": self.get_rook_moves,
@@ -28,31 +51,112 @@ class GameState:
             "Q": self.get_queen_moves,
             "K": self.get_king_moves,
         }
+        self.load_fen(fen)  # the starting position unless given another one
 
-        self.white_king_location, self.black_king_location = (4, 7), (
-            4,
-            0,
-        )  # (col, row)
+    def load_fen(self, fen):
+        """
+        Sets up the position described by a FEN string.  The logs restart from this position.
+        Raises ValueError for an invalid FEN.
+        """
+        (
+            board,
+            white_to_move,
+            castle_rights,
+            enpassant_possible,
+            self.halfmove_clock,
+            self.start_fullmove_number,
+        ) = parse_fen(fen)
+        self.board = board
+        for row in range(8):
+            for col in range(8):
+                if board[row][col] == "wK":
+                    self.white_king_location = (col, row)  # (col, row)
+                elif board[row][col] == "bK":
+                    self.black_king_location = (col, row)
 
         # initialise variables to store game data
-        self.white_to_move = True
+        self.white_to_move = white_to_move
         self.move_log = []
 
         self.pins, self.checks, self.in_check = [], [], False
+        self.attack_maps = {"w": (None, 0), "b": (None, 0)}  # see attacked_squares
         self.check_mate, self.stale_mate = False, False
 
-        self.enpassant_possible = ()
-        self.enpassant_possible_log = [self.enpassant_possible]
-
-        self.current_castling_rights = CastleRights(True, True, True, True)
-        self.castle_rights_log = [
-            CastleRights(
-                self.current_castling_rights.wks,
-                self.current_castling_rights.bks,
-                self.current_castling_rights.wqs,
-                self.current_castling_rights.bqs,
-            )
-        ]  # initial log is [(T, T, T, T)]
+        self.enpassant_possible = enpassant_possible
+        # WKS | BKS | WQS | BQS, see move.py
+        self.castle_rights = castle_rights.to_bits()
+
+        self.zobrist_key = hash_position(self)  # updated incrementally by make_move
+        self.board_score = (
+            self.compute_board_score()
+        )  # updated incrementally by make_move
+
+        # one record per move in move_log of the state the move changed and can't be worked out
+        # backwards: (castle_rights, enpassant_possible, zobrist_key, halfmove_clock, board_score)
+        # before the move.  The piece captured is in the packed move itself.
+        self.undo_stack = []
+
+    def compute_board_score(self):
+        """
+        Material + position score of the board, +ve is good for white.  make_move keeps it up to
+        date in board_score by adding the change of each move, this adds up every square from scratch.
+        """
+        score = 0
+        for row in range(8):
+            for col in range(8):
+                score += self.piece_square_scores[self.board[row][col]][row][col]
+        return score
+
+    @property
+    def current_castling_rights(self):
+        """
+        The castle rights as a CastleRights, for reading.  Change castle_rights instead.
+        """
+        return CastleRights.from_bits(self.castle_rights)
+
+    def get_fen(self):
+        """
+        FEN string of the current position.
+        """
+        return to_fen(self)
+
+    def get_halfmove_clock(self):
+        """
+        Half moves since the last capture or pawn move (for the fifty move rule).
+        """
+        return self.halfmove_clock
+
+    def is_fifty_move_draw(self):
+        return self.halfmove_clock >= 100
+
+    def repetition_count(self):
+        """
+        How many times the current position has occurred, this time included.  Only positions since
+        the last capture or pawn move can be the same, and only every other one has the same side
+        to move.
+        """
+        undo_stack = self.undo_stack
+        count = 1
+        for plies_ago in range(4, min(self.halfmove_clock, len(undo_stack)) + 1, 2):
+            if (
+                undo_stack[-plies_ago][2] == self.zobrist_key
+            ):  # the key before that move
+                count += 1
+        return count
+
+    def is_repetition(self):
+        """
+        True if the current position has occurred before.  The search scores it as a draw: if the
+        position was worth playing for, it would have been played for the first time round.
+        """
+        return self.repetition_count() > 1
+
+    def get_fullmove_number(self):
+        """
+        Starts at 1 and goes up after every black move.
+        """
+        black_started = self.white_to_move == (len(self.move_log) % 2 == 1)
+        return self.start_fullmove_number + (len(self.move_log) + black_started) // 2
 
     def get_all_possible_moves(self):
         """
@@ -89,37 +193,7 @@ class GameState:
             )
         if self.in_check:
             if len(self.checks) == 1:  # only 1 check: block check or move king
-                moves = self.get_all_possible_moves()
-                check = self.checks[0]  # (endCol, endRow, dir-col, dir-row)
-                check_col = check[0]
-                check_row = check[1]
-                piece_checking = self.board[check_row][check_col]
-                valid_squares = []
-                if (
-                    piece_checking[1] == "N"
-                ):  # if knight, must capture knight or move king
-                    valid_squares = [(check_col, check_row)]
-                else:  # else block the check
-                    for i in range(1, 8):
-                        valid_square = (
-                            king_col + check[2] * i,
-                            king_row + check[3] * i,
-                        )  # check[2] == dir-col, check[3] == dir-row
-                        valid_squares.append(valid_square)
-                        if (
-                            valid_square[0] == check_col
-                            and valid_square[1] == check_row
-                        ):  # go upto the check square
-                            break
-                # get rid of any moves that don't block check or more king
-                for i in range(
-                    len(moves) - 1, -1, -1
-                ):  # go through backwards when removing from a list
-                    if (
-                        moves[i].piece_moved[1] != "K"
-                    ):  # move doesn't move king, so must block or capture
-                        if (moves[i].end_col, moves[i].end_row) not in valid_squares:
-                            moves.remove(moves[i])
+                self.get_check_evasions(king_row, king_col, self.checks[0], moves)
             else:  # double check, king has to move
                 self.get_king_moves(king_row, king_col, moves)
         else:  # not in check so all moves are fine
@@ -134,6 +208,163 @@ class GameState:
             self.get_castle_moves(0, 4, moves)
         return moves
 
+    def get_staged_moves(self):
+        """
+        The legal moves in two lists, captures and promotions then quiet moves, from a generator so
+        the search can stop before asking for the quiet moves.  Nothing is lazy here: both lists are
+        split from one get_valid_moves call, so the quiet moves are generated before the first
+        capture is yielded.  Only BitboardGameState.generate_moves saves the quiet move generation.
+        """
+        moves = self.get_valid_moves()
+        yield [move for move in moves if move >> 16 & 0xFF]
+        yield [move for move in moves if not move >> 16 & 0xFF]
+
+    def is_legal_move(self, move):
+        """
+        True if a packed move from another position (a hash move or a killer move) is legal here,
+        without generating the moves.  Castling and en passant are always False: only the move
+        generator can tell if they are legal.
+        """
+        if move & (CASTLE_FLAG | ENPASSANT_FLAG) or not self.is_unblocked_move(move):
+            return False
+        self.make_move(move)
+        if self.white_to_move:  # black moved
+            col, row = self.black_king_location
+            legal = not self.attacked_squares("w") >> (row * 8 + col) & 1
+        else:
+            col, row = self.white_king_location
+            legal = not self.attacked_squares("b") >> (row * 8 + col) & 1
+        self.undo_move()
+        return legal
+
+    def is_unblocked_move(self, move):
+        """
+        True if the piece of a packed move is on its start square and is the side to move's, the
+        end square holds the piece the move captures (or nothing) and no piece stands in between.
+        The shape of the move isn't checked: a move played by the same piece from the same square
+        in another position has the right shape.
+        """
+        start_row, start_col = divmod(move & 63, 8)
+        end_row, end_col = divmod(move >> 6 & 63, 8)
+        piece_moved = PIECE_NAMES[move >> 12 & 15]
+        if (
+            self.board[start_row][start_col] != piece_moved
+            or (piece_moved[0] == "w") != self.white_to_move
+            or self.board[end_row][end_col] != PIECE_NAMES[move >> 16 & 15]
+        ):
+            return False
+        d_row, d_col = end_row - start_row, end_col - start_col
+        if d_row and d_col and abs(d_row) != abs(d_col):
+            return True  # a knight move: nothing in between
+        steps = max(abs(d_row), abs(d_col))
+        d_row, d_col = d_row // steps, d_col // steps
+        for i in range(1, steps):
+            if self.board[start_row + d_row * i][start_col + d_col * i] != "--":
+                return False
+        return True
+
+    def get_check_evasions(self, king_row, king_col, check, moves):
+        """
+        The moves out of a single check: king moves, captures of the checking piece and moves onto
+        the squares between it and the king.  Only generates those, working back from each square
+        that ends the check to the pieces that can reach it.  Pinned pieces can't help: they can't
+        leave the line of their pin, and the check comes along another line.
+        """
+        self.get_king_moves(king_row, king_col, moves)
+        board = self.board
+        check_col, check_row = (
+            check[0],
+            check[1],
+        )  # check == (endCol, endRow, dir-col, dir-row)
+        # the squares that end the check: the checker's, and for a slider those in between
+        if board[check_row][check_col][1] == "N":
+            block_squares = [(check_col, check_row)]
+        else:
+            block_squares = []
+            for i in range(1, 8):
+                square = (king_col + check[2] * i, king_row + check[3] * i)
+                block_squares.append(square)
+                if square == (check_col, check_row):
+                    break
+        pinned = {(pin[0], pin[1]) for pin in self.pins}
+        ally_color = "w" if self.white_to_move else "b"
+        pawn, knight = ally_color + "p", ally_color + "N"
+        back = 1 if self.white_to_move else -1  # row step from a square back to a pawn
+        double_push_row = (
+            4 if self.white_to_move else 3
+        )  # end row of a 2 square pawn move
+
+        for end_col, end_row in block_squares:
+            end_sq = end_row * 8 + end_col
+            for d_col, d_row in STEP_DIRECTIONS["N"]:
+                col, row = end_col + d_col, end_row + d_row
+                if (
+                    0 <= col < 8
+                    and 0 <= row < 8
+                    and board[row][col] == knight
+                    and (col, row) not in pinned
+                ):
+                    moves.append(pack_move(row * 8 + col, end_sq, board))
+            # bishops, rooks and queens: the first piece along each line from the square
+            for d_col, d_row in SLIDER_DIRECTIONS["Q"]:
+                sliders = "BQ" if d_col and d_row else "RQ"
+                col, row = end_col + d_col, end_row + d_row
+                while 0 <= col < 8 and 0 <= row < 8:
+                    piece = board[row][col]
+                    if piece != "--":
+                        if (
+                            piece[0] == ally_color
+                            and piece[1] in sliders
+                            and (col, row) not in pinned
+                        ):
+                            moves.append(pack_move(row * 8 + col, end_sq, board))
+                        break
+                    col, row = col + d_col, row + d_row
+            # pawns: pushes onto an empty square, captures of the checker
+            row = end_row + back
+            if not 0 <= row < 8:
+                continue
+            if board[end_row][end_col] == "--":
+                if board[row][end_col] == pawn:
+                    if (end_col, row) not in pinned:
+                        moves.append(pack_move(row * 8 + end_col, end_sq, board))
+                elif (
+                    board[row][end_col] == "--"
+                    and end_row == double_push_row
+                    and board[row + back][end_col] == pawn
+                    and (end_col, row + back) not in pinned
+                ):
+                    moves.append(pack_move((row + back) * 8 + end_col, end_sq, board))
+            else:
+                for col in (end_col - 1, end_col + 1):
+                    if (
+                        0 <= col < 8
+                        and board[row][col] == pawn
+                        and (col, row) not in pinned
+                    ):
+                        moves.append(pack_move(row * 8 + col, end_sq, board))
+
+        # en passant, if the checker is the pawn that just moved 2 squares
+        if self.enpassant_possible != ():
+            end_col, end_row = self.enpassant_possible
+            row = end_row + back
+            if (end_col, row) == (check_col, check_row):
+                for col in (end_col - 1, end_col + 1):
+                    if (
+                        0 <= col < 8
+                        and board[row][col] == pawn
+                        and (col, row) not in pinned
+                        and not self.enpassant_exposes_king(row, col, end_col, end_row)
+                    ):
+                        moves.append(
+                            pack_move(
+                                row * 8 + col,
+                                end_row * 8 + end_col,
+                                board,
+                                ENPASSANT_FLAG,
+                            )
+                        )
+
     def check_for_pins_and_checks(self):
         """
         Returns if the player is in check, a list of pins, and a list of checks
@@ -247,154 +478,210 @@ class GameState:
         """
         if len(self.move_log) != 0:  # make sure that there is a move to undo
             move = self.move_log.pop()
-            self.board[move.start_row][move.start_col] = move.piece_moved
-            self.board[move.end_row][move.end_col] = move.piece_captured
+            start_row, start_col = move >> 3 & 7, move & 7
+            end_row, end_col = move >> 9 & 7, move >> 6 & 7
+            piece_moved = PIECE_NAMES[move >> 12 & 15]
+            piece_captured = PIECE_NAMES[move >> 16 & 15]
+            self.board[start_row][start_col] = piece_moved
+            self.board[end_row][end_col] = piece_captured
             # update king's location
-            if move.piece_moved == "wK":
-                self.white_king_location = (move.start_col, move.start_row)
-            elif move.piece_moved == "bK":
-                self.black_king_location = (move.start_col, move.start_row)
+            if piece_moved == "wK":
+                self.white_king_location = (start_col, start_row)
+            elif piece_moved == "bK":
+                self.black_king_location = (start_col, start_row)
 
             self.white_to_move = not self.white_to_move  # swap players back
 
             # undo enpassant
-            if move.is_enpassant_move:
-                self.board[move.end_row][move.end_col] = "--"  # leave landing sq blank
-                self.board[move.start_row][move.end_col] = move.piece_captured
-                self.enpassant_possible = (move.end_col, move.end_row)
-            # undo a 2 sq pawn advance
-            if move.piece_moved[1] == "p" and abs(move.start_row - move.end_row) == 2:
-                self.enpassant_possible = ()
+            if move & ENPASSANT_FLAG:
+                self.board[end_row][end_col] = "--"  # leave landing sq blank
+                self.board[start_row][end_col] = piece_captured
 
             # move rook back if a castle move
-            if move.is_castle_move:
-                if move.end_col - move.start_col == 2:  # kingside
-                    self.board[move.end_row][move.end_col + 1] = self.board[
-                        move.end_row
-                    ][move.end_col - 1]
-                    self.board[move.end_row][
-                        move.end_col - 1
-                    ] = "--"  # remove the old rook
-
-                elif move.end_col - move.start_col == -2:  # queenside
-                    self.board[move.end_row][move.end_col - 2] = self.board[
-                        move.end_row
-                    ][move.end_col + 1]
-                    self.board[move.end_row][move.end_col + 1] = "--"
-
-            # undo castling rights
-            self.castle_rights_log.pop()  # get rid of castle rights from move we are undoing.
-            last_castle_rights = self.castle_rights_log[-1]
-            self.current_castling_rights = CastleRights(
-                last_castle_rights.wks,
-                last_castle_rights.bks,
-                last_castle_rights.wqs,
-                last_castle_rights.bqs,
-            )  # reinitialize castle rights to not make a copy
-
-            self.enpassant_possible_log.pop()
-            self.enpassant_possible = self.enpassant_possible_log[-1]
-
-            self.check_mate = False
-            self.stale_mate = False
+            if move & CASTLE_FLAG:
+                if end_col - start_col == 2:  # kingside
+                    self.board[end_row][end_col + 1] = self.board[end_row][end_col - 1]
+                    self.board[end_row][end_col - 1] = "--"  # remove the old rook
+
+                elif end_col - start_col == -2:  # queenside
+                    self.board[end_row][end_col - 2] = self.board[end_row][end_col + 1]
+                    self.board[end_row][end_col + 1] = "--"
+
+            # castle rights, en passant square, hash, halfmove clock and score from before the move
+            (
+                self.castle_rights,
+                self.enpassant_possible,
+                self.zobrist_key,
+                self.halfmove_clock,
+                self.board_score,
+            ) = self.undo_stack.pop()
 
     def make_move(self, move):
         """
-        Takes a Move as a parameter and executes it.  After making move, changes White to move parameter
+        Takes a packed move (see move.py) as a parameter and executes it.  After making move, changes White to move parameter
         """
-        self.board[move.start_row][move.start_col] = "--"
-        self.board[move.end_row][move.end_col] = move.piece_moved
+        start_row, start_col = move >> 3 & 7, move & 7
+        end_row, end_col = move >> 9 & 7, move >> 6 & 7
+        piece_moved = PIECE_NAMES[move >> 12 & 15]
+        piece_captured = PIECE_NAMES[move >> 16 & 15]
+        self.board[start_row][start_col] = "--"
+        self.board[end_row][end_col] = piece_moved
         self.move_log.append(move)  # log the move to undo later.
+        self.undo_stack.append(
+            (
+                self.castle_rights,
+                self.enpassant_possible,
+                self.zobrist_key,
+                self.halfmove_clock,
+                self.board_score,
+            )
+        )
+
+        # zobrist hash: take the moved and captured pieces off their squares
+        key = self.zobrist_key ^ piece_keys[piece_moved][start_row][start_col]
+        if move & ENPASSANT_FLAG:
+            key ^= piece_keys[piece_captured][start_row][end_col]
+        elif piece_captured != "--":
+            key ^= piece_keys[piece_captured][end_row][end_col]
+        if self.enpassant_possible != ():
+            key ^= enpassant_keys[self.enpassant_possible[0]]
+        key ^= castle_rights_keys[self.castle_rights]
+
+        # board score: the change in score of the moved and captured pieces
+        piece_square_scores = self.piece_square_scores
+        score = (
+            self.board_score - piece_square_scores[piece_moved][start_row][start_col]
+        )
+        if move & ENPASSANT_FLAG:
+            score -= piece_square_scores[piece_captured][start_row][end_col]
+        else:
+            score -= piece_square_scores[piece_captured][end_row][end_col]
 
         # update the king's location
-        if move.piece_moved == "wK":
-            self.white_king_location = (move.end_col, move.end_row)
-        elif move.piece_moved == "bK":
-            self.black_king_location = (move.end_col, move.end_row)
+        if piece_moved == "wK":
+            self.white_king_location = (end_col, end_row)
+        elif piece_moved == "bK":
+            self.black_king_location = (end_col, end_row)
 
         # pawn promotion
-        if move.is_pawn_promotion:
-            self.board[move.end_row][move.end_col] = move.piece_moved[0] + "Q"
+        if move >> 20 & 15:
+            self.board[end_row][end_col] = PIECE_NAMES[move >> 20 & 15]
 
         # enpassant
         if (
-            move.piece_moved[1] == "p" and abs(move.start_row - move.end_row) == 2
+            piece_moved[1] == "p" and abs(start_row - end_row) == 2
         ):  # if a pawn moves 2 squares
             self.enpassant_possible = (
-                move.start_col,
-                (move.start_row + move.end_row) // 2,
+                start_col,
+                (start_row + end_row) // 2,
             )  # enpassant possible to the square where the pawn would have moved if it had only moved 1 square.
         else:
             self.enpassant_possible = ()
-        if move.is_enpassant_move:
-            self.board[move.start_row][move.end_col] = "--"  # capturing the pawn
+        if move & ENPASSANT_FLAG:
+            self.board[start_row][end_col] = "--"  # capturing the pawn
 
         # castling
-        if move.is_castle_move:
-            if move.end_col - move.start_col == 2:  # to the right: king side castle
-                self.board[move.end_row][move.end_col - 1] = self.board[move.end_row][
-                    move.end_col + 1
+        if move & CASTLE_FLAG:
+            rook = piece_moved[0] + "R"
+            if end_col - start_col == 2:  # to the right: king side castle
+                self.board[end_row][end_col - 1] = self.board[end_row][
+                    end_col + 1
                 ]  # copy the rook to the new square
-                self.board[move.end_row][move.end_col + 1] = "--"  # remove the old rook
-
-            elif move.end_col - move.start_col == -2:  # to the left: queen side castle
-                self.board[move.end_row][move.end_col + 1] = self.board[move.end_row][
-                    move.end_col - 2
-                ]
-                self.board[move.end_row][move.end_col - 2] = "--"
-
-        self.update_castle_rights(
-            move
-        )  # update the castling rights whenever it's a rook or a king move
-        self.castle_rights_log.append(
-            CastleRights(
-                self.current_castling_rights.wks,
-                self.current_castling_rights.bks,
-                self.current_castling_rights.wqs,
-                self.current_castling_rights.bqs,
-            )
+                self.board[end_row][end_col + 1] = "--"  # remove the old rook
+                key ^= piece_keys[rook][end_row][7] ^ piece_keys[rook][end_row][5]
+                score += (
+                    piece_square_scores[rook][end_row][5]
+                    - piece_square_scores[rook][end_row][7]
+                )
+            elif end_col - start_col == -2:  # to the left: queen side castle
+                self.board[end_row][end_col + 1] = self.board[end_row][end_col - 2]
+                self.board[end_row][end_col - 2] = "--"
+                key ^= piece_keys[rook][end_row][0] ^ piece_keys[rook][end_row][3]
+                score += (
+                    piece_square_scores[rook][end_row][3]
+                    - piece_square_scores[rook][end_row][0]
+                )
+
+        # moving the king or a rook, or capturing a rook, loses castle rights
+        self.castle_rights &= (
+            CASTLE_RIGHTS_KEPT[start_row * 8 + start_col]
+            & CASTLE_RIGHTS_KEPT[end_row * 8 + end_col]
         )
 
-        self.enpassant_possible_log.append(self.enpassant_possible)
+        # zobrist hash: put the (possibly promoted) piece on its new square and add the new state
+        piece_placed = self.board[end_row][end_col]
+        key ^= piece_keys[piece_placed][end_row][end_col]
+        if self.enpassant_possible != ():
+            key ^= enpassant_keys[self.enpassant_possible[0]]
+        key ^= castle_rights_keys[self.castle_rights]
+        self.zobrist_key = key ^ black_to_move_key
+
+        if piece_moved[1] == "p" or piece_captured != "--":
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+
+        self.board_score = (
+            score + piece_square_scores[piece_placed][end_row][end_col]
+        )  # the (possibly promoted) piece on its new square
 
         self.white_to_move = not self.white_to_move  # swap players of the gameState
 
-    def update_castle_rights(self, move):
-        """
-        Update the castle rights given a move
-        """
-        # check if the king moved or the rock moved
-        if move.piece_moved == "wK":
-            self.current_castling_rights.wks = False
-            self.current_castling_rights.wqs = False
-        elif move.piece_moved == "bK":
-            self.current_castling_rights.bks = False
-            self.current_castling_rights.bqs = False
-        elif move.piece_moved == "wR":
-            if move.start_row == 7:
-                if move.start_col == 0:  # whites left rock
-                    self.current_castling_rights.wqs = False
-                if move.start_col == 7:  # whites right rock
-                    self.current_castling_rights.wks = False
-        elif move.piece_moved == "bR":
-            if move.start_row == 0:
-                if move.start_col == 0:  # black left rock
-                    self.current_castling_rights.bqs = False
-                if move.start_col == 7:  # black right rock
-                    self.current_castling_rights.bks = False
-        # check if the rock is captured
-        if move.piece_captured == "wR":
-            if move.end_row == 7:
-                if move.end_col == 0:
-                    self.current_castling_rights.wqs = False
-                elif move.end_col == 7:
-                    self.current_castling_rights.wks = False
-        elif move.piece_captured == "bR":
-            if move.end_row == 0:
-                if move.end_col == 0:
-                    self.current_castling_rights.bqs = False
-                elif move.end_col == 7:
-                    self.current_castling_rights.bks = False
+    def make_null_move(self):
+        """
+        Passes the turn without moving, for null move pruning in the search.  Undo it with
+        undo_null_move.  The logs get an entry like any other move so they stay in step.
+        """
+        self.move_log.append(NULL_MOVE)
+        self.undo_stack.append(
+            (
+                self.castle_rights,
+                self.enpassant_possible,
+                self.zobrist_key,
+                self.halfmove_clock,
+                self.board_score,
+            )
+        )
+        key = self.zobrist_key ^ black_to_move_key
+        if self.enpassant_possible != ():
+            key ^= enpassant_keys[self.enpassant_possible[0]]
+        self.enpassant_possible = ()
+        self.zobrist_key = key
+        # positions before a pass don't count as repetitions after it
+        self.halfmove_clock = 0
+        self.white_to_move = not self.white_to_move
+
+    def undo_null_move(self):
+        self.move_log.pop()
+        (
+            self.castle_rights,
+            self.enpassant_possible,
+            self.zobrist_key,
+            self.halfmove_clock,
+            self.board_score,
+        ) = self.undo_stack.pop()
+        self.white_to_move = not self.white_to_move
+
+    def king_in_check(self):
+        """
+        True if the side to move is in check.  Uses the cached attack map, so it is cheap to ask
+        before get_valid_moves.
+        """
+        if self.white_to_move:
+            col, row = self.white_king_location
+            return self.attacked_squares("b") >> (row * 8 + col) & 1 == 1
+        col, row = self.black_king_location
+        return self.attacked_squares("w") >> (row * 8 + col) & 1 == 1
+
+    def has_non_pawn_material(self, color):
+        """
+        True if color has a knight, bishop, rook or queen.  Without one, zugzwang is likely.
+        """
+        return any(
+            square[0] == color and square[1] in "NBRQ"
+            for row in self.board
+            for square in row
+        )
 
     def get_castle_moves(self, r, c, moves):
         """
@@ -411,23 +698,21 @@ class GameState:
         ) and not (self.board[r][c + 1] == "--" and self.board[r][c + 2] == "--"):
             return  # if queenside and kingside blocked, return.
 
-        if self.square_under_attack(r, c):
+        attacked = self.attacked_squares("b" if self.white_to_move else "w")
+        if attacked >> (r * 8 + c) & 1:
             return  # check if the king is inCheck as the king can't escape the check by castling
-        if (self.white_to_move and self.current_castling_rights.wks) or (
-            not self.white_to_move and self.current_castling_rights.bks
-        ):  # kingside
+        if self.castle_rights & (WKS if self.white_to_move else BKS):  # kingside
             self.get_king_side_castle_moves(r, c, moves)
-        if (self.white_to_move and self.current_castling_rights.wqs) or (
-            not self.white_to_move and self.current_castling_rights.bqs
-        ):  # queenside
+        if self.castle_rights & (WQS if self.white_to_move else BQS):  # queenside
             self.get_queen_side_castle_moves(r, c, moves)
 
     def get_king_side_castle_moves(self, r, c, moves):
         if self.board[r][c + 1] == "--" and self.board[r][c + 2] == "--":
-            if not self.square_under_attack(r, c + 1) and not self.square_under_attack(
-                r, c + 2
-            ):
-                moves.append(Move((c, r), (c + 2, r), self.board, is_castle_move=True))
+            attacked = self.attacked_squares("b" if self.white_to_move else "w")
+            if not attacked >> (r * 8 + c + 1) & 3:
+                moves.append(
+                    pack_move(r * 8 + c, r * 8 + c + 2, self.board, CASTLE_FLAG)
+                )
 
     def get_queen_side_castle_moves(self, r, c, moves):
         if (
@@ -435,10 +720,13 @@ class GameState:
             and self.board[r][c - 2] == "--"
             and self.board[r][c - 3] == "--"
         ):
-            if not self.square_under_attack(r, c - 1) and not self.square_under_attack(
-                r, c - 2
+            attacked = self.attacked_squares("b" if self.white_to_move else "w")
+            if (
+                not attacked >> (r * 8 + c - 2) & 3
             ):  # only squares king moves through need to not be under attack.
-                moves.append(Move((c, r), (c - 2, r), self.board, is_castle_move=True))
+                moves.append(
+                    pack_move(r * 8 + c, r * 8 + c - 2, self.board, CASTLE_FLAG)
+                )
 
     def square_under_attack(self, r, c):
         """
@@ -512,6 +800,53 @@ class GameState:
                         break
         return False
 
+    def attacked_squares(self, color):
+        """
+        Bitmask (bit row * 8 + col) of the squares color attacks.  Worked out once per position:
+        it is cached on the zobrist key, so repeated checks of a position are O(1) bit tests.
+        """
+        key, attacks = self.attack_maps[color]
+        if key != self.zobrist_key:
+            attacks = self.compute_attacked_squares(color)
+            self.attack_maps[color] = (self.zobrist_key, attacks)
+        return attacks
+
+    def compute_attacked_squares(self, color):
+        """
+        Squares color attacks, including squares of its own pieces (which it defends).  The other
+        king doesn't block sliders, so it can't step back along the line of a slider checking it.
+        """
+        board = self.board
+        enemy_king = ("b" if color == "w" else "w") + "K"
+        pawn_row = -1 if color == "w" else 1
+        attacks = 0
+        for r in range(8):
+            for c in range(8):
+                piece = board[r][c]
+                if piece[0] != color:
+                    continue
+                if piece[1] == "p":
+                    for end_col in (c - 1, c + 1):
+                        if 0 <= end_col < 8:
+                            attacks |= 1 << ((r + pawn_row) * 8 + end_col)
+                elif piece[1] == "N" or piece[1] == "K":
+                    for d_col, d_row in STEP_DIRECTIONS[piece[1]]:
+                        end_col, end_row = c + d_col, r + d_row
+                        if 0 <= end_col < 8 and 0 <= end_row < 8:
+                            attacks |= 1 << (end_row * 8 + end_col)
+                else:
+                    for d_col, d_row in SLIDER_DIRECTIONS[piece[1]]:
+                        end_col, end_row = c + d_col, r + d_row
+                        while 0 <= end_col < 8 and 0 <= end_row < 8:
+                            attacks |= 1 << (end_row * 8 + end_col)
+                            if (
+                                board[end_row][end_col] != "--"
+                                and board[end_row][end_col] != enemy_king
+                            ):
+                                break  # blocked
+                            end_col, end_row = end_col + d_col, end_row + d_row
+        return attacks
+
     def get_pawn_moves(self, r, c, moves):
         """
         Get all pawn moves for the pawn located at row, col and add these moves to the list
@@ -528,92 +863,119 @@ class GameState:
                 break
         if self.white_to_move:  # white pawn moves
             if self.board[r - 1][c] == "--":  # moving forwards
-                if not piece_pinned or pin_direction == (0, -1):
-                    moves.append(Move((c, r), (c, r - 1), self.board))
+                if not piece_pinned or pin_direction in ((0, -1), (0, 1)):
+                    moves.append(pack_move(r * 8 + c, (r - 1) * 8 + c, self.board))
                     if (
                         r == 6 and self.board[r - 2][c] == "--"
                     ):  # move 2 squares forward
-                        moves.append(Move((c, r), (c, r - 2), self.board))
+                        moves.append(pack_move(r * 8 + c, (r - 2) * 8 + c, self.board))
             if c - 1 >= 0:  # capturing left (ensures not off board)
                 if self.board[r - 1][c - 1][0] == "b":
-                    if not piece_pinned or pin_direction == (-1, -1):
-                        moves.append(Move((c, r), (c - 1, r - 1), self.board))
+                    if not piece_pinned or pin_direction in ((-1, -1), (1, 1)):
+                        moves.append(
+                            pack_move(r * 8 + c, (r - 1) * 8 + c - 1, self.board)
+                        )
                 elif (c - 1, r - 1) == self.enpassant_possible and self.board[r][c - 1][
                     0
                 ] == "b":
-                    moves.append(
-                        Move((c, r), (c - 1, r - 1), self.board, is_enpassant_move=True)
-                    )
-                    if not piece_pinned or pin_direction == (-1, -1):
+                    if (
+                        not piece_pinned or pin_direction in ((-1, -1), (1, 1))
+                    ) and not self.enpassant_exposes_king(r, c, c - 1, r - 1):
                         moves.append(
-                            Move(
-                                (c, r),
-                                (c - 1, r - 1),
+                            pack_move(
+                                r * 8 + c,
+                                (r - 1) * 8 + c - 1,
                                 self.board,
-                                is_enpassant_move=True,
+                                ENPASSANT_FLAG,
                             )
                         )
             if c + 1 <= 7:  # capturing right
                 if self.board[r - 1][c + 1][0] == "b":
-                    if not piece_pinned or pin_direction == (1, -1):
-                        moves.append(Move((c, r), (c + 1, r - 1), self.board))
+                    if not piece_pinned or pin_direction in ((1, -1), (-1, 1)):
+                        moves.append(
+                            pack_move(r * 8 + c, (r - 1) * 8 + c + 1, self.board)
+                        )
                 elif (c + 1, r - 1) == self.enpassant_possible and self.board[r][c + 1][
                     0
                 ] == "b":
-                    moves.append(
-                        Move((c, r), (c + 1, r - 1), self.board, is_enpassant_move=True)
-                    )
-                    if not piece_pinned or pin_direction == (1, -1):
+                    if (
+                        not piece_pinned or pin_direction in ((1, -1), (-1, 1))
+                    ) and not self.enpassant_exposes_king(r, c, c + 1, r - 1):
                         moves.append(
-                            Move(
-                                (c, r),
-                                (c + 1, r - 1),
+                            pack_move(
+                                r * 8 + c,
+                                (r - 1) * 8 + c + 1,
                                 self.board,
-                                is_enpassant_move=True,
+                                ENPASSANT_FLAG,
                             )
                         )
 
         else:  # black pawn moves
             if self.board[r + 1][c] == "--":  # moving forwards
-                if not piece_pinned or pin_direction == (0, 1):
-                    moves.append(Move((c, r), (c, r + 1), self.board))
+                if not piece_pinned or pin_direction in ((0, 1), (0, -1)):
+                    moves.append(pack_move(r * 8 + c, (r + 1) * 8 + c, self.board))
                     if (
                         r == 1 and self.board[r + 2][c] == "--"
                     ):  # move 2 squares forward
-                        moves.append(Move((c, r), (c, r + 2), self.board))
+                        moves.append(pack_move(r * 8 + c, (r + 2) * 8 + c, self.board))
             if c - 1 >= 0:  # capturing left
                 if self.board[r + 1][c - 1][0] == "w":
-                    if not piece_pinned or pin_direction == (-1, 1):
-                        moves.append(Move((c, r), (c - 1, r + 1), self.board))
+                    if not piece_pinned or pin_direction in ((-1, 1), (1, -1)):
+                        moves.append(
+                            pack_move(r * 8 + c, (r + 1) * 8 + c - 1, self.board)
+                        )
                 elif (c - 1, r + 1) == self.enpassant_possible and self.board[r][c - 1][
                     0
                 ] == "w":
-                    if not piece_pinned or pin_direction == (-1, 1):
+                    if (
+                        not piece_pinned or pin_direction in ((-1, 1), (1, -1))
+                    ) and not self.enpassant_exposes_king(r, c, c - 1, r + 1):
                         moves.append(
-                            Move(
-                                (c, r),
-                                (c - 1, r + 1),
+                            pack_move(
+                                r * 8 + c,
+                                (r + 1) * 8 + c - 1,
                                 self.board,
-                                is_enpassant_move=True,
+                                ENPASSANT_FLAG,
                             )
                         )
             if c + 1 <= 7:  # capturing right
                 if self.board[r + 1][c + 1][0] == "w":
-                    if not piece_pinned or pin_direction == (1, 1):
-                        moves.append(Move((c, r), (c + 1, r + 1), self.board))
+                    if not piece_pinned or pin_direction in ((1, 1), (-1, -1)):
+                        moves.append(
+                            pack_move(r * 8 + c, (r + 1) * 8 + c + 1, self.board)
+                        )
                 elif (c + 1, r + 1) == self.enpassant_possible and self.board[r][c + 1][
                     0
                 ] == "w":
-                    if not piece_pinned or pin_direction == (1, 1):
+                    if (
+                        not piece_pinned or pin_direction in ((1, 1), (-1, -1))
+                    ) and not self.enpassant_exposes_king(r, c, c + 1, r + 1):
                         moves.append(
-                            Move(
-                                (c, r),
-                                (c + 1, r + 1),
+                            pack_move(
+                                r * 8 + c,
+                                (r + 1) * 8 + c + 1,
                                 self.board,
-                                is_enpassant_move=True,
+                                ENPASSANT_FLAG,
                             )
                         )
 
+    def enpassant_exposes_king(self, r, c, end_col, end_row):
+        """
+        En passant takes two pawns off row r at once, which the pin check can't see (e.g. king and
+        enemy rook on the same row either side of both pawns).  Play the capture on the board and look.
+        """
+        if self.white_to_move:
+            king_col, king_row = self.white_king_location
+        else:
+            king_col, king_row = self.black_king_location
+        pawn, captured = self.board[r][c], self.board[r][end_col]
+        self.board[r][c], self.board[r][end_col] = "--", "--"
+        self.board[end_row][end_col] = pawn
+        exposed = self.square_under_attack(king_row, king_col)
+        self.board[r][c], self.board[r][end_col] = pawn, captured
+        self.board[end_row][end_col] = "--"
+        return exposed
+
     def get_rook_moves(self, r, c, moves):
         """
         Get all Rook moves for the Rook located at row, col and add these moves to the list
@@ -644,11 +1006,15 @@ class GameState:
                     ):
                         end_piece = self.board[end_row][end_col]
                         if end_piece == "--":  # if blank, append move
-                            moves.append(Move((c, r), (end_col, end_row), self.board))
+                            moves.append(
+                                pack_move(r * 8 + c, end_row * 8 + end_col, self.board)
+                            )
                         elif (
                             end_piece[0] == enemy_color
                         ):  # hits enemy piece, append then break
-                            moves.append(Move((c, r), (end_col, end_row), self.board))
+                            moves.append(
+                                pack_move(r * 8 + c, end_row * 8 + end_col, self.board)
+                            )
                             break
                         else:  # hits own color piece
                             break
@@ -688,11 +1054,15 @@ class GameState:
                     ):
                         end_piece = self.board[end_row][end_col]
                         if end_piece == "--":  # if blank, append move
-                            moves.append(Move((c, r), (end_col, end_row), self.board))
+                            moves.append(
+                                pack_move(r * 8 + c, end_row * 8 + end_col, self.board)
+                            )
                         elif (
                             end_piece[0] == enemy_color
                         ):  # hits enemy piece, append then break
-                            moves.append(Move((c, r), (end_col, end_row), self.board))
+                            moves.append(
+                                pack_move(r * 8 + c, end_row * 8 + end_col, self.board)
+                            )
                             break
                         else:  # hits own color piece
                             break
@@ -736,11 +1106,14 @@ class GameState:
                 if not piece_pinned:
                     end_piece = self.board[end_row][end_col]
                     if end_piece[0] != ally_color:
-                        moves.append(Move((c, r), (end_col, end_row), self.board))
+                        moves.append(
+                            pack_move(r * 8 + c, end_row * 8 + end_col, self.board)
+                        )
 
     def get_king_moves(self, r, c, moves):
         """
-        Get all King moves for the King located at row, col and add these moves to the list
+        Get all King moves for the King located at row, col and add these moves to the list.
+        A king move is legal if the enemy doesn't attack the end square (see attacked_squares).
         """
         potential_moves = (
             (-1, -1),
@@ -753,6 +1126,9 @@ class GameState:
             (0, -1),
         )
         ally_color = "w" if self.white_to_move == True else "b"
+        attacked = self.attacked_squares(
+            "b" if ally_color == "w" else "w"
+        )  # worked out once, with the king not blocking the enemy sliders
         for m in potential_moves:
             end_row = r + m[0]
             end_col = c + m[1]
@@ -761,17 +1137,9 @@ class GameState:
             ):  # confine the potential moves to the board
                 end_piece = self.board[end_row][end_col]
                 if end_piece[0] != ally_color:  # empty or enemy piece
-                    if ally_color == "w":  # place king on square and check for checks
-                        self.white_king_location = (end_col, end_row)
-                    else:
-                        self.black_king_location = (end_col, end_row)
-                    in_check, pins, checks = self.check_for_pins_and_checks()
-                    if not in_check:
-                        moves.append(Move((c, r), (end_col, end_row), self.board))
-                    if ally_color == "w":
-                        self.white_king_location = (
-                            c,
-                            r,
-                        )  # place king back on original location
-                    else:
-                        self.black_king_location = (c, r)
+                    if (
+                        not attacked >> (end_row * 8 + end_col) & 1
+                    ):  # not moving into check
+                        moves.append(
+                            pack_move(r * 8 + c, end_row * 8 + end_col, self.board)
+                        )
@@ -1,6 +1,7 @@
 from multiprocessing import Process, Queue
 from chess_game_state import GameState
-from chess_ai import find_best_move, find_random_move
+from bitboard_game_state import BitboardGameState
+from chess_ai import search_process, find_random_move
 from move import Move
 from display_funcs import *
 
@@ -8,6 +9,9 @@ WIDTH = HEIGHT = 768
 DIMENSION = 8  # dimensions of chess board = 8x8
 SQ_SIZE = HEIGHT // DIMENSION
 MAX_FPS = 15
+USE_BITBOARDS = (
+    True  # True: BitboardGameState move generation.  False: the original GameState
+)
 
 
 def main():
@@ -25,8 +29,13 @@ def main():
     move_made = False
     game_over = False
     ai_thinking = False
-    chess_ai_process = None
-    gs = GameState()  # initialize the GameState, white_to_move = True
+    # the AI searches in its own process, which keeps its search tables for the whole game
+    ai_requests, ai_results = Queue(), Queue()
+    chess_ai_process = Process(target=search_process, args=(ai_requests, ai_results))
+    chess_ai_process.start()
+    gs = (
+        BitboardGameState() if USE_BITBOARDS else GameState()
+    )  # initialize the GameState, white_to_move = True
     sq_selected = ()  # no square is selected initially.  Keeps track of last click of user (tuple: (col, row))
     player_clicks = []  # keep track of player clicks (two tuples: [(4, 7), (4, 5)])
 
@@ -35,7 +44,7 @@ def main():
     )
     black_player = False  # same as above, but for black.
 
-    valid_moves = gs.get_valid_moves()
+    valid_moves = get_valid_ui_moves(gs)
     print()
     print("-----White to move-----")
 
@@ -83,7 +92,7 @@ def main():
                             if (
                                 move_attempt == valid_moves[i]
                             ):  # if move is in all moves, make move, change move_made variable, clear player_clicks.
-                                gs.make_move(valid_moves[i])
+                                gs.make_move(valid_moves[i].packed)
                                 move_made = True
                                 sq_selected = ()
                                 player_clicks = []
@@ -100,17 +109,19 @@ def main():
                         white_player and black_player
                     ):  # if both human players, undo the last human move
                         gs.undo_move()
-                        valid_moves = gs.get_valid_moves()
+                        valid_moves = get_valid_ui_moves(gs)
                         game_over = False
                     if white_player and not black_player:  # if only white human player
                         gs.undo_move()
                         gs.undo_move()
-                        valid_moves = gs.get_valid_moves()
+                        valid_moves = get_valid_ui_moves(gs)
                         game_over = False
 
         if game_over:  # end of game logic
             clock.tick(5)
-            if gs.in_check:
+            if valid_moves:  # a draw by rule
+                draw_text(screen, get_draw_reason(gs))
+            elif gs.in_check:
                 if gs.white_to_move:
                     draw_text(screen, "Black wins by checkmate")
                 else:
@@ -124,41 +135,60 @@ def main():
         if not is_human_turn and not game_over:
             if not ai_thinking:
                 ai_thinking = True
-                return_queue = Queue()
-                chess_ai_process = Process(
-                    target=find_best_move, args=(gs, valid_moves, return_queue)
-                )
-                chess_ai_process.start()
-
-            if not chess_ai_process.is_alive():  # if done thinking.
-                ai_move = return_queue.get()
+                ai_requests.put((gs, [move.packed for move in valid_moves]))
+
+            if not ai_results.empty():  # if done thinking.
+                ai_move = ai_results.get()
                 if ai_move is not None:
                     gs.make_move(ai_move)
                     move_made = True
                 else:  # if checkmate inevitable
                     if valid_moves:
                         ai_move = find_random_move(valid_moves)
-                        gs.make_move(ai_move)
+                        gs.make_move(ai_move.packed)
                         move_made = True
                 ai_thinking = False
 
         if move_made:  # only calculate new moves after each turn, not each frame.
-            animate_move(gs.move_log[-1], screen, gs.board, clock)
-            print([move.move_id for move in gs.move_log])
+            animate_move(Move.from_packed(gs.move_log[-1]), screen, gs.board, clock)
+            print([Move.from_packed(move).move_id for move in gs.move_log])
             print()
             (
                 print("-----White to move-----")
                 if gs.white_to_move
                 else print("-----Black to move-----")
             )
-            valid_moves = gs.get_valid_moves()
+            valid_moves = get_valid_ui_moves(gs)
             if not valid_moves:  # if no valid moves for next turn then game_over
                 game_over = True
+            elif get_draw_reason(gs) is not None:
+                game_over = True
             move_made = False
 
         p.display.flip()  # updates the full display Surface to the screen.
         draw_game_state(screen, gs, valid_moves, sq_selected)
 
+    ai_requests.put(None)  # stop the AI process once it finishes any search in progress
+    chess_ai_process.join()
+
+
+def get_draw_reason(gs):
+    """
+    Why the game is drawn by threefold repetition or the fifty move rule, or None if it isn't.
+    """
+    if gs.repetition_count() >= 3:
+        return "Draw by repetition"
+    if gs.is_fifty_move_draw():
+        return "Draw by fifty move rule"
+    return None
+
+
+def get_valid_ui_moves(gs):
+    """
+    The GameState generates packed moves, the UI works with Move objects.
+    """
+    return [Move.from_packed(move) for move in gs.get_valid_moves()]
+
 
 if __name__ == "__main__":
     main()
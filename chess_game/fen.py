@@ -0,0 +1,124 @@
+from move import CastleRights
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+FILES = "abcdefgh"
+PIECE_CHARS = "pnbrqkPNBRQK"
+
+
+def parse_fen(fen):
+    """
+    Parses a FEN string.  Raises ValueError if it isn't a valid position.
+    Returns (board, white_to_move, castle_rights, enpassant_possible, halfmove_clock, fullmove_number)
+    in GameState's formats.  Castle rights without the king and rook on their squares, and en passant
+    squares with no pawn that just moved 2 squares, are dropped so make_move can rely on them.
+    """
+    fields = fen.split()
+    if not 1 <= len(fields) <= 6:
+        raise ValueError(f"FEN must have 1 to 6 fields: {fen!r}")
+    fields += ["w", "-", "-", "0", "1"][len(fields) - 1 :]  # default missing fields
+    placement, side, castling, enpassant, halfmove, fullmove = fields
+
+    board = []
+    for rank in placement.split("/"):
+        row = []
+        for char in rank:
+            if char in "12345678":
+                row += ["--"] * int(char)
+            elif char in PIECE_CHARS:
+                # upper case is white, lower case is black.  Pawns are "p" in GameState
+                color = "w" if char.isupper() else "b"
+                row.append(color + ("p" if char in "Pp" else char.upper()))
+            else:
+                raise ValueError(f"invalid character {char!r} in FEN: {fen!r}")
+        if len(row) != 8:
+            raise ValueError(f"FEN rank {rank!r} is not 8 squares: {fen!r}")
+        board.append(row)
+    if len(board) != 8:
+        raise ValueError(f"FEN must have 8 ranks: {fen!r}")
+    for king in ("wK", "bK"):
+        if sum(row.count(king) for row in board) != 1:
+            raise ValueError(f"FEN must have exactly one {king}: {fen!r}")
+    if any(piece[1] == "p" for piece in board[0] + board[7]):
+        raise ValueError(f"pawns can't be on the first or last rank: {fen!r}")
+
+    if side not in ("w", "b"):
+        raise ValueError(f"side to move must be 'w' or 'b': {fen!r}")
+    white_to_move = side == "w"
+
+    if castling != "-" and (not castling or set(castling) - set("KQkq")):
+        raise ValueError(f"invalid castling rights {castling!r}: {fen!r}")
+    castle_rights = CastleRights(
+        "K" in castling and board[7][4] == "wK" and board[7][7] == "wR",
+        "k" in castling and board[0][4] == "bK" and board[0][7] == "bR",
+        "Q" in castling and board[7][4] == "wK" and board[7][0] == "wR",
+        "q" in castling and board[0][4] == "bK" and board[0][0] == "bR",
+    )
+
+    enpassant_possible = ()
+    if enpassant != "-":
+        if len(enpassant) != 2 or enpassant[0] not in FILES or enpassant[1] not in "36":
+            raise ValueError(f"invalid en passant square {enpassant!r}: {fen!r}")
+        col, row = FILES.index(enpassant[0]), 8 - int(enpassant[1])
+        pawn_row, pawn = (row + 1, "bp") if white_to_move else (row - 1, "wp")
+        if (row == 2) == white_to_move and board[pawn_row][col] == pawn:
+            enpassant_possible = (col, row)
+
+    try:
+        halfmove_clock, fullmove_number = int(halfmove), int(fullmove)
+    except ValueError:
+        raise ValueError(f"invalid move counters: {fen!r}") from None
+    return (
+        board,
+        white_to_move,
+        castle_rights,
+        enpassant_possible,
+        halfmove_clock,
+        max(fullmove_number, 1),
+    )
+
+
+def board_to_fen(board):
+    """
+    The piece placement field of a FEN string.
+    """
+    ranks = []
+    for row in board:
+        rank, empty = "", 0
+        for square in row:
+            if square == "--":
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            char = "P" if square[1] == "p" else square[1]
+            rank += char if square[0] == "w" else char.lower()
+        ranks.append(rank + (str(empty) if empty else ""))
+    return "/".join(ranks)
+
+
+def to_fen(gs):
+    """
+    FEN string of a GameState's current position.
+    """
+    rights = gs.current_castling_rights
+    castling = (
+        ("K" if rights.wks else "")
+        + ("Q" if rights.wqs else "")
+        + ("k" if rights.bks else "")
+        + ("q" if rights.bqs else "")
+    ) or "-"
+    enpassant = "-"
+    if gs.enpassant_possible != ():
+        col, row = gs.enpassant_possible
+        enpassant = FILES[col] + str(8 - row)
+    return " ".join(
+        (
+            board_to_fen(gs.board),
+            "w" if gs.white_to_move else "b",
+            castling,
+            enpassant,
+            str(gs.get_halfmove_clock()),
+            str(gs.get_fullmove_number()),
+        )
+    )
@@ -1,8 +1,80 @@
+# Move generation and the search use moves packed into ints, which are much cheaper to create and
+# compare than Move objects.  Move objects are only built for the UI, with Move.from_packed.
+# Squares are numbered row * 8 + col, the same as the bitboards.
+#   bits 0-5    start square
+#   bits 6-11   end square
+#   bits 12-15  piece moved, as an index into PIECE_NAMES
+#   bits 16-19  piece captured (0 if none)
+#   bits 20-23  piece promoted to (0 if not a promotion)
+#   bit 24      en passant
+#   bit 25      castle
+PIECE_NAMES = (
+    "--",
+    "wp",
+    "wN",
+    "wB",
+    "wR",
+    "wQ",
+    "wK",
+    "bp",
+    "bN",
+    "bB",
+    "bR",
+    "bQ",
+    "bK",
+)
+PIECE_CODES = {piece: code for code, piece in enumerate(PIECE_NAMES)}
+ENPASSANT_FLAG = 1 << 24
+CASTLE_FLAG = 1 << 25
+NULL_MOVE = 0  # passing the turn, logged by GameState.make_null_move
+# castle rights bits, GameState.castle_rights
+WKS, BKS, WQS, BQS = 1, 2, 4, 8
+# the castle rights left after a move from or to each square: moving the king or a rook, or
+# capturing a rook, loses the rights that need that piece on its square
+CASTLE_RIGHTS_KEPT = [15] * 64
+CASTLE_RIGHTS_KEPT[0] = 15 ^ BQS  # a8
+CASTLE_RIGHTS_KEPT[4] = 15 ^ BKS ^ BQS  # e8
+CASTLE_RIGHTS_KEPT[7] = 15 ^ BKS  # h8
+CASTLE_RIGHTS_KEPT[56] = 15 ^ WQS  # a1
+CASTLE_RIGHTS_KEPT[60] = 15 ^ WKS ^ WQS  # e1
+CASTLE_RIGHTS_KEPT[63] = 15 ^ WKS  # h1
+
+
+def pack_move(start_sq, end_sq, board, flags=0):
+    """
+    Packs the move start_sq -> end_sq on board into an int.  flags is ENPASSANT_FLAG, CASTLE_FLAG
+    or 0.  Pawns reaching the last row promote to a queen.
+    """
+    piece_moved = board[start_sq >> 3][start_sq & 7]
+    move = start_sq | end_sq << 6 | PIECE_CODES[piece_moved] << 12 | flags
+    if flags & ENPASSANT_FLAG:
+        move |= PIECE_CODES["bp" if piece_moved == "wp" else "wp"] << 16
+    else:
+        move |= PIECE_CODES[board[end_sq >> 3][end_sq & 7]] << 16
+        if piece_moved[1] == "p" and (end_sq < 8 or end_sq >= 56):
+            move |= PIECE_CODES[piece_moved[0] + "Q"] << 20
+    return move
+
+
 class Move:
     """
     Defines the move class that is passed into the move functions of the GameState
     """
 
+    __slots__ = (
+        "start_col",
+        "start_row",
+        "end_col",
+        "end_row",
+        "piece_moved",
+        "piece_captured",
+        "move_id",
+        "is_pawn_promotion",
+        "is_enpassant_move",
+        "is_castle_move",
+        "packed",
+    )
+
     def __init__(
         self, start_sq, end_sq, board, is_enpassant_move=False, is_castle_move=False
     ):  # ((start_col, start_row), (end_col, end_row), board)
@@ -14,7 +86,9 @@ class Move:
         self.piece_moved = board[self.start_row][self.start_col]
         self.piece_captured = board[self.end_row][self.end_col]
 
-        self.move_id = f"C{self.start_col:01d}R{self.start_row:01d} -> C{self.end_col:01d}R{self.end_row:01d}"
+        self.move_id = (
+            f"C{self.start_col}R{self.start_row} -> C{self.end_col}R{self.end_row}"
+        )
 
         self.is_pawn_promotion = (self.piece_moved == "wp" and self.end_row == 0) or (
             self.piece_moved == "bp" and self.end_row == 7
@@ -28,6 +102,48 @@ class Move:
         # castle
         self.is_castle_move = is_castle_move
 
+        # the same move packed into an int, for GameState.make_move and the AI
+        self.packed = pack_move(
+            self.start_row * 8 + self.start_col,
+            self.end_row * 8 + self.end_col,
+            board,
+            (ENPASSANT_FLAG if is_enpassant_move else 0)
+            | (CASTLE_FLAG if is_castle_move else 0),
+        )
+
+    @classmethod
+    def from_packed(cls, packed):
+        """
+        Builds the Move for a packed move.  The packed move carries the pieces, so no board is needed.
+        """
+        move = cls.__new__(cls)
+        move.start_row, move.start_col = divmod(packed & 63, 8)
+        move.end_row, move.end_col = divmod(packed >> 6 & 63, 8)
+        move.piece_moved = PIECE_NAMES[packed >> 12 & 15]
+        move.piece_captured = PIECE_NAMES[packed >> 16 & 15]
+        move.move_id = (
+            f"C{move.start_col}R{move.start_row} -> C{move.end_col}R{move.end_row}"
+        )
+        move.is_pawn_promotion = packed >> 20 & 15 != 0
+        move.is_enpassant_move = packed & ENPASSANT_FLAG != 0
+        move.is_castle_move = packed & CASTLE_FLAG != 0
+        move.packed = packed
+        return move
+
+    def get_uci_notation(self):
+        """
+        The move in UCI (long algebraic) notation, e.g. "e2e4", "e7e8q".  Row 0 is rank 8.
+        """
+        notation = (
+            "abcdefgh"[self.start_col]
+            + str(8 - self.start_row)
+            + "abcdefgh"[self.end_col]
+            + str(8 - self.end_row)
+        )
+        if self.is_pawn_promotion:
+            notation += "q"  # pawns always promote to a queen
+        return notation
+
     def __eq__(self, other):
         """
         Overriding the equals method. Only needed as we are using a class, would not be needed if we used strings, ints etc.
@@ -40,8 +156,26 @@ class Move:
 
 
 class CastleRights:
+    """
+    Castle rights as four booleans.  GameState keeps them packed into the 4 bits of castle_rights.
+    """
+
+    __slots__ = ("wks", "bks", "wqs", "bqs")
+
     def __init__(self, wks, bks, wqs, bqs):
         self.wks = wks
         self.bks = bks
         self.wqs = wqs
         self.bqs = bqs
+
+    @classmethod
+    def from_bits(cls, bits):
+        return cls(bits & WKS != 0, bits & BKS != 0, bits & WQS != 0, bits & BQS != 0)
+
+    def to_bits(self):
+        return (
+            (WKS if self.wks else 0)
+            | (BKS if self.bks else 0)
+            | (WQS if self.wqs else 0)
+            | (BQS if self.bqs else 0)
+        )
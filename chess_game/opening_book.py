@@ -0,0 +1,101 @@
+"""
+Polyglot (.bin) opening books.  A book is a file of 16 byte entries sorted by position key:
+    key     8 bytes, the polyglot_hash of the position
+    move    2 bytes: to file, to rank, from file, from rank (3 bits each, from the low bits up),
+            then 3 bits of promotion piece (0 none, 1 knight, 2 bishop, 3 rook, 4 queen)
+    weight  2 bytes, how often to play the move relative to the other moves of the position
+    learn   4 bytes, unused
+all big-endian.  The file is memory-mapped and the entries of a position found by binary search,
+so a probe costs a few microseconds and the book is never read into memory.
+"""
+
+import mmap
+import random
+import struct
+
+from polyglot_keys import polyglot_hash
+
+ENTRY_SIZE = 16
+ENTRY_FORMAT = ">QHHI"  # key, move, weight, learn
+
+
+class OpeningBook:
+    """
+    A Polyglot book file, memory-mapped read-only.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as book_file:
+            try:
+                self.data = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file, which can't be mapped
+                self.data = b""
+        self.entry_count = len(self.data) // ENTRY_SIZE
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def get_entries(self, key):
+        """
+        (move, weight) of every entry for key, the polyglot moves as stored in the book.
+        """
+        low, high = 0, self.entry_count
+        while low < high:  # first entry with a key >= key
+            middle = (low + high) // 2
+            if struct.unpack_from(">Q", self.data, middle * ENTRY_SIZE)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        for index in range(low, self.entry_count):
+            entry_key, move, weight, learn = struct.unpack_from(
+                ENTRY_FORMAT, self.data, index * ENTRY_SIZE
+            )
+            if entry_key != key:
+                break
+            entries.append((move, weight))
+        return entries
+
+    def get_moves(self, gs, valid_moves=None):
+        """
+        (packed move, weight) of the book moves for the position, in book order.  Moves that aren't
+        legal here (a key collision or a broken book) and under-promotions, which GameState doesn't
+        generate, are left out.
+        """
+        if valid_moves is None:
+            valid_moves = gs.get_valid_moves()
+        squares = {(move & 63, move >> 6 & 63): move for move in valid_moves}
+        moves = []
+        for book_move, weight in self.get_entries(polyglot_hash(gs)):
+            promotion = book_move >> 12 & 7
+            if promotion not in (0, 4):
+                continue
+            end_col, end_row = book_move & 7, 7 - (book_move >> 3 & 7)
+            start_col, start_row = book_move >> 6 & 7, 7 - (book_move >> 9 & 7)
+            piece = gs.board[start_row][start_col]
+            if piece[1] == "K" and gs.board[end_row][end_col] == piece[0] + "R":
+                # polyglot castles as king takes own rook, GameState as the king moving 2 squares
+                end_col = 6 if end_col > start_col else 2
+            move = squares.get((start_row * 8 + start_col, end_row * 8 + end_col))
+            if move is None:
+                continue
+            moves.append((move, weight))
+        return moves
+
+    def choose_move(self, gs, valid_moves=None, rng=random):
+        """
+        A book move for the position picked at random in proportion to the weights, or None if the
+        position isn't in the book.
+        """
+        moves = [
+            (move, weight)
+            for move, weight in self.get_moves(gs, valid_moves)
+            if weight > 0
+        ]
+        if not moves:
+            return None
+        return rng.choices(
+            [move for move, weight in moves], [weight for move, weight in moves]
+        )[0]
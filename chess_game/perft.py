@@ -0,0 +1,222 @@
+"""
+Perft: counts the leaf nodes of the legal move tree to a fixed depth.  Comparing the counts with
+known reference values is the standard check that move generation is correct, and the time it
+takes is the standard measure of move generation speed.
+
+    python perft.py --depth 4                     # start position
+    python perft.py --fen "<fen>" --depth 3 --divide
+    python perft.py --suite --max-nodes 1000000   # reference positions
+    python perft.py --suite --engine bitboard
+
+GameState only ever promotes to a queen, so the reference counts below are the standard published
+counts only up to depths where no promotion can happen (checked against an engine with
+under-promotions).
+"""
+
+import argparse
+import sys
+import time
+from chess_game_state import GameState
+from bitboard_game_state import BitboardGameState
+from fen import START_FEN
+from move import Move
+
+ENGINES = {"gamestate": GameState, "bitboard": BitboardGameState}
+
+# (name, fen, {depth: nodes})
+REFERENCE_POSITIONS = [
+    (
+        "start",
+        START_FEN,
+        {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609},
+    ),
+    (
+        "kiwipete",
+        "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        {1: 48, 2: 2039, 3: 97862},
+    ),
+    (
+        "position3",
+        "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+        {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624},
+    ),
+    (
+        "position4",
+        "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+        {1: 6},
+    ),
+    (
+        "position6",
+        "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+        {1: 46, 2: 2079, 3: 89890, 4: 3894594},
+    ),
+    (
+        "illegal_enpassant_1",
+        "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1",
+        {1: 18, 2: 92, 3: 1670, 4: 10138, 5: 185429},
+    ),
+    (
+        "illegal_enpassant_2",
+        "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1",
+        {1: 13, 2: 102, 3: 1266, 4: 10276, 5: 135655},
+    ),
+    (
+        "enpassant_capture_checks",
+        "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1",
+        {1: 15, 2: 126, 3: 1928, 4: 13931},
+    ),
+    (
+        "short_castle_gives_check",
+        "5k2/8/8/8/8/8/8/4K2R w K - 0 1",
+        {1: 15, 2: 66, 3: 1198, 4: 6399, 5: 120330, 6: 661072},
+    ),
+    (
+        "long_castle_gives_check",
+        "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1",
+        {1: 16, 2: 71, 3: 1286, 4: 7418, 5: 141077, 6: 803711},
+    ),
+    (
+        "castle_rights",
+        "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1",
+        {1: 26, 2: 1141, 3: 27826, 4: 1274206},
+    ),
+    (
+        "castle_prevented",
+        "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1",
+        {1: 44, 2: 1494, 3: 50509, 4: 1720476},
+    ),
+    (
+        "self_stalemate",
+        "K1k5/8/P7/8/8/8/8/8 w - - 0 1",
+        {1: 2, 2: 6, 3: 13, 4: 63},
+    ),
+    (
+        "discovered_check",
+        "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1",
+        {1: 37, 2: 183, 3: 6559, 4: 23527},
+    ),
+    (
+        "double_check",
+        "8/5k2/8/5N2/5Q2/2K5/8/8 w - - 0 1",
+        {1: 37, 2: 183, 3: 6559, 4: 23527},
+    ),
+]
+
+
+def perft(gs, depth):
+    """
+    Number of leaf nodes depth plies below the current position.  The last ply is counted with
+    len(get_valid_moves()) rather than by making each move.
+    """
+    moves = gs.get_valid_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        gs.make_move(move)
+        nodes += perft(gs, depth - 1)
+        gs.undo_move()
+    return nodes
+
+
+def divide(gs, depth):
+    """
+    perft split by root move: a list of (move, nodes).  Diffing this against another engine's divide
+    output is how a wrong count is tracked down to the move that causes it.
+    """
+    results = []
+    for move in gs.get_valid_moves():
+        gs.make_move(move)
+        results.append((move, perft(gs, depth - 1)))
+        gs.undo_move()
+    return results
+
+
+def run_position(engine, fen, depth, show_divide=False):
+    """
+    Runs perft on one position, printing the result.  Returns (nodes, seconds).
+    """
+    gs = engine(fen)
+    start_time = time.perf_counter()
+    if show_divide:
+        results = divide(gs, depth)
+        nodes = sum(count for move, count in results)
+    else:
+        nodes = perft(gs, depth)
+    seconds = time.perf_counter() - start_time
+    if show_divide:
+        for notation, count in sorted(
+            (Move.from_packed(move).get_uci_notation(), count)
+            for move, count in results
+        ):
+            print(f"{notation}: {count}")
+        print()
+    print(
+        f"depth: {depth}     nodes: {nodes}     Time: {seconds:.2f}     nps: {nodes / max(seconds, 1e-9):.0f}"
+    )
+    return nodes, seconds
+
+
+def run_suite(engine, max_nodes, max_depth=None):
+    """
+    Runs every reference position at the deepest depth whose reference count is at most max_nodes.
+    Returns True if every count matches.
+    """
+    all_passed = True
+    total_nodes, total_seconds = 0, 0.0
+    for name, fen, counts in REFERENCE_POSITIONS:
+        depths = [
+            depth
+            for depth, nodes in counts.items()
+            if nodes <= max_nodes and (max_depth is None or depth <= max_depth)
+        ]
+        if not depths:
+            continue
+        depth = max(depths)
+        gs = engine(fen)
+        start_time = time.perf_counter()
+        nodes = perft(gs, depth)
+        seconds = time.perf_counter() - start_time
+        total_nodes += nodes
+        total_seconds += seconds
+        passed = nodes == counts[depth]
+        all_passed = all_passed and passed
+        print(
+            f"{'ok  ' if passed else 'FAIL'}  {name:<26} depth: {depth}  nodes: {nodes:>8} (expected {counts[depth]:>8})     Time: {seconds:6.2f}     nps: {nodes / max(seconds, 1e-9):.0f}"
+        )
+    print(
+        f"total nodes: {total_nodes}     Time: {total_seconds:.2f}     nps: {total_nodes / max(total_seconds, 1e-9):.0f}"
+    )
+    return all_passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft move generation test")
+    parser.add_argument("--fen", default=START_FEN, help="position to search")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument(
+        "--divide", action="store_true", help="print the node count of every root move"
+    )
+    parser.add_argument(
+        "--suite", action="store_true", help="run the reference positions"
+    )
+    parser.add_argument(
+        "--max-nodes",
+        type=int,
+        default=200000,
+        help="suite: largest reference count to run",
+    )
+    parser.add_argument(
+        "--max-depth", type=int, default=None, help="suite: deepest depth to run"
+    )
+    parser.add_argument("--engine", choices=ENGINES, default="gamestate")
+    args = parser.parse_args()
+
+    engine = ENGINES[args.engine]
+    if args.suite:
+        sys.exit(0 if run_suite(engine, args.max_nodes, args.max_depth) else 1)
+    run_position(engine, args.fen, args.depth, args.divide)
+
+
+if __name__ == "__main__":
+    main()
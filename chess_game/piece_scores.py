@@ -69,3 +69,30 @@ piece_position_scores = {
     "wK": king_score,
     "bK": king_score[::-1],
 }
+
+
+def make_piece_square_scores(values=piece_score, position_weight=0.1):
+    """
+    Score of each piece on each square: its value + position_weight * its position score, +ve for
+    white pieces and -ve for black pieces.  The score of a board is the sum over its squares, so
+    GameState can keep it up to date by adding the change of each move.  table["wN"][row][col]
+    """
+    table = {
+        piece: [
+            [
+                (1 if piece[0] == "w" else -1)
+                * (
+                    values[piece[1]]
+                    + piece_position_scores[piece][row][col] * position_weight
+                )
+                for col in range(8)
+            ]
+            for row in range(8)
+        ]
+        for piece in piece_position_scores
+    }
+    table["--"] = [[0] * 8 for row in range(8)]  # empty square
+    return table
+
+
+piece_square_scores = make_piece_square_scores()  # the tables GameState uses by default
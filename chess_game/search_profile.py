@@ -0,0 +1,184 @@
+"""
+Search profiling: what a search spent its nodes and time on, as a JSON report.
+Set profile_file on a Searcher and every search writes its report there, e.g.
+    Searcher(search_processes=1, profile_file="profile.json").find_best_move(gs)
+Profiling slows the search down (every GameState call is timed), so compare reports with each
+other rather than with unprofiled times.
+"""
+
+import json
+import time
+
+
+class SearchProfile:
+    """
+    The counters and timers of one search.  The Searcher records iterations and beta cutoffs,
+    ProfiledGameState and timed() record the function calls.
+    """
+
+    def __init__(self, gs, transposition_table):
+        self.fen = gs.get_fen()
+        self.root_ply = len(gs.move_log)
+        self.transposition_table = transposition_table
+        self.tt_probes = transposition_table.probes
+        self.tt_hits = transposition_table.hits
+        self.start_time = time.perf_counter()
+        # function name -> [calls, seconds]
+        self.functions = {
+            name: [0, 0.0]
+            for name in (
+                "get_valid_moves",
+                "get_staged_moves",
+                "score_board",
+                "make_move",
+                "undo_move",
+                "make_null_move",
+                "undo_null_move",
+            )
+        }
+        # beta_cutoffs[i]: cutoffs by the i-th move searched at a node
+        self.beta_cutoffs = []
+        self.iterations = []
+        # ply from the root -> [nodes that generated moves, moves generated]
+        self.plies = []
+
+    def timed(self, name, function):
+        """
+        function, timing its calls under name.
+        """
+        counters = self.functions[name]
+        perf_counter = time.perf_counter
+
+        def timed_function(*args):
+            start = perf_counter()
+            result = function(*args)
+            counters[1] += perf_counter() - start
+            counters[0] += 1
+            return result
+
+        return timed_function
+
+    def count_moves(self, ply, move_count, nodes=1):
+        while len(self.plies) <= ply:
+            self.plies.append([0, 0])
+        self.plies[ply][0] += nodes
+        self.plies[ply][1] += move_count
+
+    def beta_cutoff(self, move_index):
+        while len(self.beta_cutoffs) <= move_index:
+            self.beta_cutoffs.append(0)
+        self.beta_cutoffs[move_index] += 1
+
+    def end_iteration(self, depth, score, nodes):
+        """
+        Records a completed iterative deepening iteration.  nodes is the search's running total.
+        """
+        iteration_nodes = nodes - sum(
+            iteration["nodes"] for iteration in self.iterations
+        )
+        previous_nodes = self.iterations[-1]["nodes"] if self.iterations else 0
+        self.iterations.append(
+            {
+                "depth": depth,
+                "score": score,
+                "nodes": iteration_nodes,
+                "seconds": time.perf_counter() - self.start_time,
+                # how many times more nodes than the last iteration
+                "effective_branching_factor": (
+                    iteration_nodes / previous_nodes if previous_nodes else None
+                ),
+            }
+        )
+
+    def report(self, nodes, best_move):
+        """
+        The profile as a dict of plain values, ready for json.
+        """
+        seconds = time.perf_counter() - self.start_time
+        tt_probes = self.transposition_table.probes - self.tt_probes
+        tt_hits = self.transposition_table.hits - self.tt_hits
+        cutoffs = sum(self.beta_cutoffs)
+        return {
+            "fen": self.fen,
+            "best_move": best_move,
+            "depth": self.iterations[-1]["depth"] if self.iterations else 0,
+            "nodes": nodes,
+            "seconds": seconds,
+            "nodes_per_second": nodes / seconds if seconds else None,
+            # score_board calls: the leaves, quiescence stand pats and null move tests
+            "evaluations": self.functions["score_board"][0],
+            "transposition_table": {
+                "probes": tt_probes,
+                "hits": tt_hits,
+                "hit_rate": tt_hits / tt_probes if tt_probes else None,
+            },
+            "beta_cutoffs": {
+                "total": cutoffs,
+                "by_move_index": self.beta_cutoffs,
+                "first_move_rate": (
+                    self.beta_cutoffs[0] / cutoffs if cutoffs else None
+                ),
+            },
+            "functions": {
+                name: {
+                    "calls": calls,
+                    "seconds": function_seconds,
+                    "share": function_seconds / seconds if seconds else None,
+                }
+                for name, (calls, function_seconds) in self.functions.items()
+            },
+            "iterations": self.iterations,
+            # moves generated per node at each ply from the root, quiescence nodes included.  Nodes
+            # that cut off before their quiet moves were generated bring this down
+            "plies": [
+                {
+                    "ply": ply,
+                    "nodes": generations,
+                    "branching_factor": moves / generations if generations else None,
+                }
+                for ply, (generations, moves) in enumerate(self.plies)
+            ],
+        }
+
+    def write(self, path, nodes, best_move):
+        with open(path, "w") as profile_file:
+            json.dump(self.report(nodes, best_move), profile_file, indent=2)
+
+
+class ProfiledGameState:
+    """
+    Stands in for a GameState in a profiled search, timing its move generation and make/undo
+    calls.  Everything else is passed through to the GameState.
+    """
+
+    def __init__(self, gs, profile):
+        self.gs = gs
+        self.profile = profile
+        self.make_move = profile.timed("make_move", gs.make_move)
+        self.undo_move = profile.timed("undo_move", gs.undo_move)
+        self.make_null_move = profile.timed("make_null_move", gs.make_null_move)
+        self.undo_null_move = profile.timed("undo_null_move", gs.undo_null_move)
+        self.timed_get_valid_moves = profile.timed(
+            "get_valid_moves", gs.get_valid_moves
+        )
+
+    def get_valid_moves(self):
+        moves = self.timed_get_valid_moves()
+        self.profile.count_moves(
+            len(self.gs.move_log) - self.profile.root_ply, len(moves)
+        )
+        return moves
+
+    def get_staged_moves(self):
+        ply = len(self.gs.move_log) - self.profile.root_ply
+        stages = self.gs.get_staged_moves()
+        next_stage = self.profile.timed("get_staged_moves", stages.__next__)
+        moves = next_stage()  # captures and promotions
+        self.profile.count_moves(ply, len(moves))
+        yield moves
+        moves = next_stage()  # quiet moves, at the same node
+        self.profile.count_moves(ply, len(moves), 0)
+        yield moves
+
+    def __getattr__(self, name):
+        return getattr(self.gs, name)
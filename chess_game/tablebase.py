@@ -0,0 +1,700 @@
+"""
+Endgame tablebases: win/draw/loss and distance to mate for every position of a small material set
+(KQK, KRK, KPK, KBNK...), built by retrograde analysis and stored one file per material set.
+
+    python tablebase.py KQK KRK KPK KBNK --dir tablebases
+
+generates the tables, and the tables they need (a capture or promotion leaves the material set),
+into the directory.  Searcher(tablebase_dir="tablebases") probes them in the search.
+
+A material set is named by the white pieces then the black pieces, e.g. KRKP is king and rook
+against king and pawn.  Tables are stored with the stronger side as white; a position with the
+colours the other way round is flipped before probing.  Castling and en passant are never
+possible in a table, and pawns only promote to queens, as in GameState.
+
+File format: an 8 byte header, b"TB" + the material set padded with spaces, then one signed byte
+per position index, memory-mapped when probed.  From the point of view of the side to move:
+    0       draw
+    n > 0   win, mate in n moves
+    n < 0   loss, mated in -n - 1 moves (-1: checkmated)
+    -128    not a position (illegal, or another index of a symmetrical position)
+The index is the white king's square (reduced by symmetry: a1-d1-d4 triangle without pawns, files
+a-d with pawns), then the square of every other piece, then the side to move.
+
+Generation, for each position: count the distinct positions the side to move can reach without
+leaving the table, and score the moves that do leave it (captures, promotions) from the smaller
+tables.  Then, from the checkmates out, one ply at a time: a position with a move to a lost
+position is won, and a position whose moves all reach won positions is lost, found by "un-making"
+moves from the newly decided positions.  Whatever is left undecided is a draw.
+"""
+
+import argparse
+import mmap
+import os
+import time
+from array import array
+
+PIECE_ORDER = "QRBNP"  # order of the pieces in a material set name, and strongest first
+HEADER_SIZE = 8
+NOT_A_POSITION = -128
+
+# square = row * 8 + col like the rest of the engine, row 0 is rank 8
+TRANSFORMS = [
+    [
+        new_row * 8 + new_col
+        for square in range(64)
+        for row, col in [divmod(square, 8)]
+        for new_row, new_col in [transform(row, col)]
+    ]
+    for transform in (
+        lambda row, col: (row, col),
+        lambda row, col: (row, 7 - col),
+        lambda row, col: (7 - row, col),
+        lambda row, col: (7 - row, 7 - col),
+        lambda row, col: (col, row),
+        lambda row, col: (col, 7 - row),
+        lambda row, col: (7 - col, row),
+        lambda row, col: (7 - col, 7 - row),
+    )
+]
+# white king squares in the index: the a1-d1-d4 triangle without pawns, files a-d with pawns
+PAWNLESS_KING_SQUARES = [
+    square for square in range(64) if square % 8 <= 3 and 7 - square // 8 <= square % 8
+]
+PAWN_KING_SQUARES = [square for square in range(64) if square % 8 <= 3]
+
+KING_STEPS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+KNIGHT_STEPS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+ROOK_DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+BISHOP_DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+
+def _step_targets(steps):
+    return [
+        [
+            (row + d_row) * 8 + col + d_col
+            for d_row, d_col in steps
+            if 0 <= row + d_row < 8 and 0 <= col + d_col < 8
+        ]
+        for row, col in (divmod(square, 8) for square in range(64))
+    ]
+
+
+def _rays(directions):
+    rays = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        square_rays = []
+        for d_row, d_col in directions:
+            ray = []
+            r, c = row + d_row, col + d_col
+            while 0 <= r < 8 and 0 <= c < 8:
+                ray.append(r * 8 + c)
+                r, c = r + d_row, c + d_col
+            square_rays.append(ray)
+        rays.append(square_rays)
+    return rays
+
+
+KING_TARGETS = _step_targets(KING_STEPS)
+KNIGHT_TARGETS = _step_targets(KNIGHT_STEPS)
+ROOK_RAYS = _rays(ROOK_DIRECTIONS)
+BISHOP_RAYS = _rays(BISHOP_DIRECTIONS)
+SLIDER_RAYS = {"R": ROOK_RAYS, "B": BISHOP_RAYS}
+SLIDER_RAYS["Q"] = [ROOK_RAYS[square] + BISHOP_RAYS[square] for square in range(64)]
+KING_MASKS = [sum(1 << target for target in targets) for targets in KING_TARGETS]
+KNIGHT_MASKS = [sum(1 << target for target in targets) for targets in KNIGHT_TARGETS]
+# squares a pawn on the square attacks, white pawns move up the board (towards row 0)
+PAWN_ATTACK_MASKS = {
+    color: [
+        sum(
+            1 << (row + d_row) * 8 + col + d_col
+            for d_col in (-1, 1)
+            if 0 <= row + d_row < 8 and 0 <= col + d_col < 8
+        )
+        for row, col in (divmod(square, 8) for square in range(64))
+    ]
+    for color, d_row in (("w", -1), ("b", 1))
+}
+# squares strictly between two squares on a line, and which sliders move along that line
+BETWEEN = [[0] * 64 for square in range(64)]
+LINE_PIECES = [[""] * 64 for square in range(64)]
+for _square in range(64):
+    for _pieces, _rays_of in (("RQ", ROOK_RAYS), ("BQ", BISHOP_RAYS)):
+        for _ray in _rays_of[_square]:
+            _between = 0
+            for _target in _ray:
+                BETWEEN[_square][_target] = _between
+                LINE_PIECES[_square][_target] = _pieces
+                _between |= 1 << _target
+
+
+def material_key(pieces):
+    """
+    The material set name of a list of pieces ("wK", "bQ"...), e.g. "KQK".
+    """
+    white = sorted(
+        (piece[1] for piece in pieces if piece[0] == "w" and piece[1] != "K"),
+        key=PIECE_ORDER.index,
+    )
+    black = sorted(
+        (piece[1] for piece in pieces if piece[0] == "b" and piece[1] != "K"),
+        key=PIECE_ORDER.index,
+    )
+    return "K" + "".join(white) + "K" + "".join(black)
+
+
+def split_material(material):
+    """
+    "KRKP" -> ("R", "P"): the white and black pieces other than the kings.
+    """
+    if material.count("K") != 2 or not material.startswith("K"):
+        raise ValueError(f"invalid material set {material!r}")
+    white, black = material[1:].split("K")
+    if any(piece not in PIECE_ORDER for piece in white + black):
+        raise ValueError(f"invalid material set {material!r}")
+    return white, black
+
+
+def is_stronger(white, black):
+    """
+    True if the white pieces come first in table naming: the side with the stronger pieces is
+    white, so each material set has one table.
+    """
+    if len(white) != len(black):
+        return len(white) > len(black)
+    return sorted(map(PIECE_ORDER.index, white)) <= sorted(
+        map(PIECE_ORDER.index, black)
+    )
+
+
+def normalise_material(material):
+    """
+    The table name for a material set and whether the colours have to be flipped to use it.
+    """
+    white, black = split_material(material)
+    white = "".join(sorted(white, key=PIECE_ORDER.index))
+    black = "".join(sorted(black, key=PIECE_ORDER.index))
+    if is_stronger(white, black):
+        return "K" + white + "K" + black, False
+    return "K" + black + "K" + white, True
+
+
+def is_insufficient_material(material):
+    """
+    Material sets that can't mate, which need no table: KK, KBK, KNK.
+    """
+    white, black = split_material(material)
+    return len(white) + len(black) == 0 or (
+        len(white) + len(black) == 1 and (white + black) in "BN"
+    )
+
+
+class TableLayout:
+    """
+    The position index of a material set: pieces is the white king, the black king, then the other
+    white pieces and the other black pieces, each in PIECE_ORDER.
+    """
+
+    def __init__(self, material):
+        white, black = split_material(material)
+        self.material = material
+        self.pieces = (
+            ["wK", "bK"]
+            + ["w" + piece for piece in white]
+            + ["b" + piece for piece in black]
+        )
+        self.has_pawns = "P" in white + black
+        king_squares = PAWN_KING_SQUARES if self.has_pawns else PAWNLESS_KING_SQUARES
+        transforms = TRANSFORMS[:2] if self.has_pawns else TRANSFORMS
+        self.king_squares = king_squares
+        self.king_slots = [-1] * 64
+        for slot, square in enumerate(king_squares):
+            self.king_slots[square] = slot
+        # the transforms that take a white king square into the index's king squares
+        self.king_transforms = [
+            [
+                transform
+                for transform in transforms
+                if self.king_slots[transform[square]] >= 0
+            ]
+            for square in range(64)
+        ]
+        # runs of the same piece, whose squares are sorted so the order doesn't matter
+        self.identical_groups = []
+        start = 2
+        for end in range(3, len(self.pieces) + 1):
+            if end == len(self.pieces) or self.pieces[end] != self.pieces[start]:
+                if end - start > 1:
+                    self.identical_groups.append((start, end))
+                start = end
+        self.size = len(king_squares) * 64 ** (len(self.pieces) - 1) * 2
+
+    def index(self, squares, white_to_move):
+        """
+        The index of the position with the pieces on squares (in self.pieces order), the smallest
+        index of any of its symmetrical images.
+        """
+        best = None
+        for transform in self.king_transforms[squares[0]]:
+            mapped = [transform[square] for square in squares]
+            for start, end in self.identical_groups:
+                mapped[start:end] = sorted(mapped[start:end])
+            index = self.king_slots[mapped[0]]
+            for square in mapped[1:]:
+                index = index * 64 + square
+            index = index * 2 + (0 if white_to_move else 1)
+            if best is None or index < best:
+                best = index
+        return best
+
+    def squares_of(self, index):
+        """
+        (squares, white_to_move) of an index.
+        """
+        white_to_move = index & 1 == 0
+        index >>= 1
+        squares = []
+        for i in range(len(self.pieces) - 1):
+            index, square = divmod(index, 64)
+            squares.append(square)
+        squares.append(self.king_squares[index])
+        squares.reverse()
+        return squares, white_to_move
+
+
+def attacks(piece, square, target, occupied):
+    """
+    True if piece ("wQ"...) on square attacks target, with the squares in occupied blocking sliders.
+    """
+    kind = piece[1]
+    if kind == "K":
+        return KING_MASKS[square] >> target & 1
+    if kind == "N":
+        return KNIGHT_MASKS[square] >> target & 1
+    if kind == "P":
+        return PAWN_ATTACK_MASKS[piece[0]][square] >> target & 1
+    return (
+        kind in LINE_PIECES[square][target] and not BETWEEN[square][target] & occupied
+    )
+
+
+def is_attacked(pieces, squares, target, color, occupied):
+    """
+    True if a piece of color attacks target.  None in squares is a captured piece.
+    """
+    for piece, square in zip(pieces, squares):
+        if (
+            square is not None
+            and piece[0] == color
+            and attacks(piece, square, target, occupied)
+        ):
+            return True
+    return False
+
+
+def piece_moves(piece, square, occupied):
+    """
+    (target, promotes) for every square piece can move to, captures of either colour included.
+    The caller throws out captures of its own pieces.
+    """
+    kind = piece[1]
+    if kind == "K":
+        return [(target, False) for target in KING_TARGETS[square]]
+    if kind == "N":
+        return [(target, False) for target in KNIGHT_TARGETS[square]]
+    if kind == "P":
+        row = square // 8
+        step, start_row, last_row = (-8, 6, 0) if piece[0] == "w" else (8, 1, 7)
+        moves = []
+        if not occupied >> (square + step) & 1:
+            moves.append((square + step, (square + step) // 8 == last_row))
+            if row == start_row and not occupied >> (square + 2 * step) & 1:
+                moves.append((square + 2 * step, False))
+        for target in range(64):
+            if (
+                PAWN_ATTACK_MASKS[piece[0]][square] >> target & 1
+                and occupied >> target & 1
+            ):
+                moves.append((target, target // 8 == last_row))
+        return moves
+    moves = []
+    for ray in SLIDER_RAYS[kind][square]:
+        for target in ray:
+            moves.append((target, False))
+            if occupied >> target & 1:
+                break
+    return moves
+
+
+def piece_unmoves(piece, square, occupied):
+    """
+    Squares piece on square could have come from with a move that stays in the table: not a
+    capture or a promotion, so always to an empty square.
+    """
+    kind = piece[1]
+    if kind == "P":
+        step, double_row = (8, 4) if piece[0] == "w" else (-8, 3)
+        origin = square + step
+        if not 8 <= origin < 56 or occupied >> origin & 1:
+            return []
+        if square // 8 == double_row and not occupied >> (origin + step) & 1:
+            return [origin, origin + step]
+        return [origin]
+    return [
+        target
+        for target, promotes in piece_moves(piece, square, occupied)
+        if not occupied >> target & 1
+    ]
+
+
+class Tablebases:
+    """
+    The tables in a directory, memory-mapped as they are first probed.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.tables = {}  # material -> (TableLayout, mmap), None if there is no file
+        self.max_pieces = 2
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.endswith(".tb"):
+                    self.max_pieces = max(self.max_pieces, len(name) - 3)
+
+    def get_table(self, material):
+        if material not in self.tables:
+            path = os.path.join(self.directory, material + ".tb")
+            if os.path.exists(path):
+                with open(path, "rb") as table_file:
+                    data = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+                if data[:HEADER_SIZE] != table_header(material):
+                    raise ValueError(f"{path} is not a {material} table")
+                self.tables[material] = (TableLayout(material), data)
+            else:
+                self.tables[material] = None
+        return self.tables[material]
+
+    def probe_pieces(self, pieces, squares, white_to_move):
+        """
+        The table value for the side to move (see the module docstring), or None if there is no table
+        for the material.  pieces are "wK", "bQ"... and squares their squares.
+        """
+        material, flip = normalise_material(material_key(pieces))
+        if is_insufficient_material(material):
+            return 0
+        table = self.get_table(material)
+        if table is None:
+            return None
+        layout, data = table
+        if flip:  # swap the colours and mirror the board top to bottom
+            pieces = [("b" if piece[0] == "w" else "w") + piece[1] for piece in pieces]
+            squares = [square ^ 56 for square in squares]
+            white_to_move = not white_to_move
+        ordered = [None] * len(layout.pieces)
+        used = [False] * len(pieces)
+        for slot, wanted in enumerate(layout.pieces):
+            for i, piece in enumerate(pieces):
+                if piece == wanted and not used[i]:
+                    ordered[slot], used[i] = squares[i], True
+                    break
+        value = data[HEADER_SIZE + layout.index(ordered, white_to_move)]
+        return value - 256 if value > 127 else value
+
+    def probe(self, gs):
+        """
+        The table value of a GameState for the side to move, or None if it has more pieces than the
+        tables, castle rights or an en passant capture, or there is no table for its material.
+        """
+        pieces, squares = [], []
+        for row in range(8):
+            for col in range(8):
+                if gs.board[row][col] != "--":
+                    if len(pieces) == self.max_pieces:
+                        return None
+                    piece = gs.board[row][col]
+                    pieces.append(piece[0] + piece[1].upper())  # "wp" -> "wP"
+                    squares.append(row * 8 + col)
+        if gs.castle_rights:  # the 4 bit castle rights, any of them set
+            return None
+        if (
+            gs.enpassant_possible != ()
+        ):  # fine unless a pawn can actually take en passant
+            col, row = gs.enpassant_possible
+            pawn_row, ally_pawn = (
+                (row + 1, "wp") if gs.white_to_move else (row - 1, "bp")
+            )
+            if any(
+                0 <= capture_col < 8 and gs.board[pawn_row][capture_col] == ally_pawn
+                for capture_col in (col - 1, col + 1)
+            ):
+                return None
+        return self.probe_pieces(pieces, squares, gs.white_to_move)
+
+
+def table_header(material):
+    return b"TB" + material.ljust(HEADER_SIZE - 2).encode()
+
+
+def plies_of(value):
+    """
+    Table value -> signed plies to mate: +plies for a win, -plies for a loss, None for a draw.
+    """
+    if value > 0:
+        return 2 * value - 1
+    if value < 0:
+        return -2 * (-value - 1)
+    return None
+
+
+def generate_table(material, tablebases, log=print):
+    """
+    Builds the table for material by retrograde analysis and writes it to tablebases.directory.
+    The tables for the material sets its captures and promotions lead to must be there already.
+    """
+    start_time = time.time()
+    layout = TableLayout(material)
+    pieces, size = layout.pieces, layout.size
+    king_index = [pieces.index("wK"), pieces.index("bK")]
+    values = array("b", [NOT_A_POSITION]) * size
+    decided = bytearray(size)  # 1 once values[index] is final
+    # in-table children not yet known to be wins for the opponent
+    remaining = bytearray(size)
+    # index -> (fastest win, is there a draw, slowest loss) in plies, over the exit moves
+    exits = {}
+    # plies -> indexes decided at that distance by exit moves
+    win_buckets, loss_buckets = {}, {}
+    losses = []  # checkmated positions
+
+    # pass 1: every position's moves
+    for index in range(size):
+        squares, white_to_move = layout.squares_of(index)
+        if (
+            len(set(squares)) != len(squares)
+            or layout.index(squares, white_to_move) != index
+        ):
+            continue  # two pieces on a square, or another index is used for the position
+        if any(
+            piece[1] == "P" and square // 8 in (0, 7)
+            for piece, square in zip(pieces, squares)
+        ):
+            continue
+        color, enemy = ("w", "b") if white_to_move else ("b", "w")
+        occupied = 0
+        for square in squares:
+            occupied |= 1 << square
+        enemy_king = squares[king_index[white_to_move]]
+        if is_attacked(pieces, squares, enemy_king, color, occupied):
+            continue  # the side not to move is in check
+        values[index] = 0
+
+        children = set()
+        best_win, has_draw, worst_loss = None, False, None
+        own_king = king_index[not white_to_move]
+        for i, (piece, square) in enumerate(zip(pieces, squares)):
+            if piece[0] != color:
+                continue
+            for target, promotes in piece_moves(piece, square, occupied):
+                captured = None
+                if occupied >> target & 1:
+                    captured = squares.index(target)
+                    if pieces[captured][0] == color:
+                        continue
+                new_squares = list(squares)
+                new_squares[i] = target
+                if captured is not None:
+                    new_squares[captured] = None
+                new_occupied = occupied & ~(1 << square) | 1 << target
+                if is_attacked(
+                    pieces, new_squares, new_squares[own_king], enemy, new_occupied
+                ):
+                    continue  # illegal, leaves the king in check
+                if captured is None and not promotes:
+                    children.add(layout.index(new_squares, not white_to_move))
+                    continue
+                # the move leaves the table: look the child up in the smaller table
+                new_pieces = list(pieces)
+                if promotes:
+                    new_pieces[i] = color + "Q"
+                child_pieces = [
+                    p for p, s in zip(new_pieces, new_squares) if s is not None
+                ]
+                child_squares = [s for s in new_squares if s is not None]
+                child = tablebases.probe_pieces(
+                    child_pieces, child_squares, not white_to_move
+                )
+                if child is None:
+                    raise ValueError(
+                        f"{material} needs the {normalise_material(material_key(child_pieces))[0]} table"
+                    )
+                plies = plies_of(child)
+                if plies is None:
+                    has_draw = True
+                elif plies <= 0:  # the opponent is lost
+                    best_win = (
+                        -plies + 1 if best_win is None else min(best_win, -plies + 1)
+                    )
+                else:
+                    worst_loss = (
+                        plies + 1 if worst_loss is None else max(worst_loss, plies + 1)
+                    )
+
+        remaining[index] = len(children)
+        if best_win is not None:
+            win_buckets.setdefault(best_win, []).append(index)
+        if best_win is not None or has_draw or worst_loss is not None:
+            exits[index] = (best_win, has_draw, worst_loss)
+        if not children:
+            if best_win is not None or has_draw:
+                continue
+            if worst_loss is not None:
+                loss_buckets.setdefault(worst_loss, []).append(index)
+            elif is_attacked(pieces, squares, squares[own_king], enemy, occupied):
+                decided[index] = 1
+                values[index] = -1  # checkmate
+                losses.append(index)
+            else:
+                decided[index] = 1  # stalemate, a draw
+    log(f"{material}: {size} indexes, moves counted in {time.time() - start_time:.1f}s")
+
+    def predecessors(index):
+        """
+        The indexes of the in-table positions with a move to the position at index.
+        """
+        squares, white_to_move = layout.squares_of(index)
+        mover = "b" if white_to_move else "w"
+        occupied = 0
+        for square in squares:
+            occupied |= 1 << square
+        found = set()
+        # after the un-move the side to move (now the mover) must not be attacking the other king
+        other_king = squares[king_index[not white_to_move]]
+        for i, (piece, square) in enumerate(zip(pieces, squares)):
+            if piece[0] != mover:
+                continue
+            for origin in piece_unmoves(piece, square, occupied):
+                new_squares = list(squares)
+                new_squares[i] = origin
+                new_occupied = occupied & ~(1 << square) | 1 << origin
+                if is_attacked(pieces, new_squares, other_king, mover, new_occupied):
+                    continue
+                found.add(layout.index(new_squares, not white_to_move))
+        return found
+
+    # pass 2: out from the checkmates, one ply at a time
+    plies = 0
+    total_wins = total_losses = len(losses)
+    while losses or any(key > plies for key in list(win_buckets) + list(loss_buckets)):
+        plies += 1
+        wins = []
+        for index in losses:
+            for parent in predecessors(index):
+                if not decided[parent]:
+                    decided[parent] = 1
+                    values[parent] = (plies + 1) // 2
+                    wins.append(parent)
+        for index in win_buckets.pop(plies, []):
+            if not decided[index]:
+                decided[index] = 1
+                values[index] = (plies + 1) // 2
+                wins.append(index)
+        for index in wins:
+            for parent in predecessors(index):
+                if decided[parent]:
+                    continue
+                remaining[parent] -= 1
+                if remaining[parent] == 0:
+                    best_win, has_draw, worst_loss = exits.get(
+                        parent, (None, False, None)
+                    )
+                    if best_win is not None:
+                        continue  # decided as a win by its exit move
+                    if has_draw:
+                        decided[parent] = 1
+                        continue
+                    loss_plies = (
+                        plies + 1 if worst_loss is None else max(plies + 1, worst_loss)
+                    )
+                    loss_buckets.setdefault(loss_plies, []).append(parent)
+        plies += 1
+        losses = []
+        for index in loss_buckets.pop(plies, []):
+            if not decided[index]:
+                decided[index] = 1
+                values[index] = -(plies // 2) - 1
+                losses.append(index)
+        # an exit win at an even distance can't happen: a win is always an odd number of plies
+        total_wins += len(wins)
+        total_losses += len(losses)
+
+    os.makedirs(tablebases.directory, exist_ok=True)
+    path = os.path.join(tablebases.directory, material + ".tb")
+    with open(path, "wb") as table_file:
+        table_file.write(table_header(material))
+        values.tofile(table_file)
+    tablebases.tables.pop(material, None)
+    tablebases.max_pieces = max(tablebases.max_pieces, len(material))
+    log(
+        f"{material}: {total_wins} wins, {total_losses} losses, longest mate {max(values)} moves, "
+        f"{time.time() - start_time:.1f}s -> {path}"
+    )
+
+
+def required_tables(material):
+    """
+    The material sets a capture or promotion in material leads to, which need a table.
+    """
+    white, black = split_material(material)
+    results = []
+    for i, piece in enumerate(white):
+        results.append((white[:i] + white[i + 1 :], black))  # captured
+        if piece == "P":
+            results.append((white[:i] + white[i + 1 :] + "Q", black))  # promoted
+    for i, piece in enumerate(black):
+        results.append((white, black[:i] + black[i + 1 :]))
+        if piece == "P":
+            results.append((white, black[:i] + black[i + 1 :] + "Q"))
+    required = set()
+    for white, black in results:
+        table = normalise_material("K" + white + "K" + black)[0]
+        if not is_insufficient_material(table):
+            required.add(table)
+    return required
+
+
+def generate(materials, directory, log=print):
+    """
+    Generates the tables for materials, and the tables they need first, skipping any already in
+    directory.
+    """
+    tablebases = Tablebases(directory)
+
+    def build(material):
+        material = normalise_material(material)[0]
+        if (
+            is_insufficient_material(material)
+            or tablebases.get_table(material) is not None
+        ):
+            return
+        for required in sorted(required_tables(material), key=len):
+            build(required)
+        generate_table(material, tablebases, log)
+
+    for material in materials:
+        build(material)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate endgame tablebases.")
+    parser.add_argument(
+        "materials", nargs="+", help="material sets, e.g. KQK KRK KPK KBNK"
+    )
+    parser.add_argument(
+        "--dir", default="tablebases", help="directory for the table files"
+    )
+    args = parser.parse_args()
+    generate(args.materials, args.dir)
+
+
+if __name__ == "__main__":
+    main()
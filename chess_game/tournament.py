@@ -0,0 +1,394 @@
+"""
+Self-play tournament: plays games between two engine configurations across a process pool and
+writes the results (win/draw/loss, Elo difference with a 95% error bar, nodes per second and time
+per move) to a JSON file.
+
+    python tournament.py --games 20 --a depth=3 --b depth=3,N=3.2
+    python tournament.py --games 50 --a depth=4,time_limit=1 --b depth=4,use_quiescence=false
+    python tournament.py --config match.json --output results.json
+
+An engine is a comma separated list of key=value settings (or a JSON object in --config):
+    name            name in the results
+    depth           maximum search depth (default 3)
+    time_limit      seconds per move, null for none (default null)
+    nodes           node budget per move, null for none (default null)
+    K Q R B N p     piece values for the evaluation tables (piece_scores.piece_score)
+    position_weight weight of the position tables in the evaluation (default 0.1)
+    hash_mb         transposition table megabytes (default 16)
+    anything else   a chess_ai.Searcher setting, e.g. use_quiescence=false, DELTA_MARGIN=3
+
+Every opening is a few random moves from the start position and is played twice, once with each
+engine as white.  Games are adjudicated as draws by the fifty move rule, threefold repetition,
+insufficient material and a ply limit, and as wins once both engines agree one side is winning by
+resign_score pawns for resign_moves moves each.
+"""
+
+import argparse
+import json
+import math
+import random
+import time
+from multiprocessing import Pool
+
+from bitboard_game_state import BitboardGameState
+from chess_ai import Searcher, SETTINGS
+from move import Move
+from piece_scores import piece_score, make_piece_square_scores
+
+DEFAULT_ENGINE = {
+    "depth": 3,
+    "time_limit": None,
+    "nodes": None,
+    "piece_values": {},
+    "position_weight": 0.1,
+    "hash_mb": 16,
+    "options": {},
+}
+DEFAULT_RULES = {
+    "opening_plies": 6,  # random moves played before the engines take over
+    "max_plies": 300,  # draw after this many plies
+    "resign_score": 10,  # pawns
+    "resign_moves": 3,  # moves each both engines must agree for the resign adjudication
+}
+
+
+def parse_value(text):
+    """
+    JSON values (3, 0.5, true, null...), anything else is kept as a string.
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def parse_engine(settings, default_name):
+    """
+    Engine config from a "key=value,key=value" string or a dict of the same keys.
+    Raises ValueError for an unknown Searcher setting.
+    """
+    if isinstance(settings, str):
+        settings = dict(
+            (item.split("=", 1)[0].strip(), parse_value(item.split("=", 1)[1].strip()))
+            for item in settings.split(",")
+            if "=" in item
+        )
+    engine = dict(DEFAULT_ENGINE, name=default_name, piece_values={}, options={})
+    for key, value in settings.items():
+        if key in piece_score:
+            engine["piece_values"][key] = value
+        elif key in ("piece_values", "options"):
+            engine[key].update(value)
+        elif key in DEFAULT_ENGINE or key == "name":
+            engine[key] = value
+        elif key in SETTINGS:
+            engine["options"][key] = value
+        else:
+            raise ValueError(f"unknown engine setting {key!r}")
+    return engine
+
+
+class Engine:
+    """
+    One engine in a game: its own GameState (so it can use its own evaluation tables) and its own
+    Searcher with the engine's settings.  Keeps count of the nodes and time it used.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        scores = make_piece_square_scores(
+            dict(piece_score, **config["piece_values"]), config["position_weight"]
+        )
+        self.gs = BitboardGameState(scores=scores)
+        settings = dict(
+            config["options"],
+            white_depth=config["depth"],
+            black_depth=config["depth"],
+            white_time_limit=config["time_limit"],
+            black_time_limit=config["time_limit"],
+            max_nodes=config["nodes"],
+            search_processes=1,
+            info_callback=ignore_info,
+        )
+        self.searcher = Searcher(config["hash_mb"], **settings)
+        self.nodes, self.seconds, self.moves = 0, 0.0, 0
+
+    def search(self):
+        """
+        Searches the current position.  Returns (move, score) with the score from white's point of
+        view.
+        """
+        valid_moves = self.gs.get_valid_moves()
+        start_time = time.time()
+        move = self.searcher.find_best_move(self.gs, valid_moves)
+        self.seconds += time.time() - start_time
+        self.nodes += self.searcher.counter
+        self.moves += 1
+        if move is None:  # every move gets mated
+            move = valid_moves[0]
+        # best_score is also set for book and tablebase moves, which don't call info_callback
+        score = self.searcher.best_score
+        return move, score if self.gs.white_to_move else -score
+
+
+def ignore_info(depth, score, nodes, seconds, pv):
+    """
+    Searcher.info_callback for the engines, which keeps them from printing every iteration.
+    """
+
+
+def insufficient_material(board):
+    """
+    True if neither side can mate: bare kings, or king and one bishop or knight against a king.
+    """
+    pieces = [square[1] for row in board for square in row if square != "--"]
+    others = [piece for piece in pieces if piece != "K"]
+    return len(others) == 0 or (len(others) == 1 and others[0] in "BN")
+
+
+def play_game(task):
+    """
+    Pool task: plays one game.  task is (game index, opening moves, white config, black config,
+    rules).  Returns the game record.
+    """
+    index, opening, white_config, black_config, rules = task
+    white, black = Engine(white_config), Engine(black_config)
+    engines = (white, black)
+    moves = []
+    for move in opening:
+        for engine in engines:
+            engine.gs.make_move(move)
+        moves.append(move)
+
+    gs = white.gs  # both engines' GameStates hold the same position
+    scores = []  # white's point of view, one per engine move
+    result, reason = "1/2-1/2", "move limit"
+    while len(moves) < rules["max_plies"]:
+        if not gs.get_valid_moves():
+            if gs.in_check:
+                result = "0-1" if gs.white_to_move else "1-0"
+                reason = "checkmate"
+            else:
+                reason = "stalemate"
+            break
+        if gs.is_fifty_move_draw():
+            reason = "fifty moves"
+            break
+        if gs.repetition_count() >= 3:
+            reason = "repetition"
+            break
+        if insufficient_material(gs.board):
+            reason = "insufficient material"
+            break
+        resign_plies = 2 * rules["resign_moves"]
+        if len(scores) >= resign_plies:
+            recent = scores[-resign_plies:]
+            if all(score >= rules["resign_score"] for score in recent):
+                result, reason = "1-0", "adjudicated"
+                break
+            if all(score <= -rules["resign_score"] for score in recent):
+                result, reason = "0-1", "adjudicated"
+                break
+
+        move, score = (white if gs.white_to_move else black).search()
+        scores.append(score)
+        for engine in engines:
+            engine.gs.make_move(move)
+        moves.append(move)
+
+    return {
+        "index": index,
+        "white": white_config["name"],
+        "black": black_config["name"],
+        "result": result,
+        "reason": reason,
+        "plies": len(moves),
+        "moves": " ".join(Move.from_packed(move).get_uci_notation() for move in moves),
+        "stats": {
+            engine.config["name"]: {
+                "nodes": engine.nodes,
+                "seconds": engine.seconds,
+                "moves": engine.moves,
+            }
+            for engine in engines
+        },
+    }
+
+
+def random_opening(rng, plies):
+    """
+    plies random legal moves from the start position, not ending in a finished game.
+    """
+    while True:
+        gs = BitboardGameState()
+        opening = []
+        for ply in range(plies):
+            valid_moves = gs.get_valid_moves()
+            if not valid_moves:
+                break
+            move = rng.choice(valid_moves)
+            gs.make_move(move)
+            opening.append(move)
+        if len(opening) == plies and gs.get_valid_moves():
+            return opening
+
+
+def elo_difference(wins, draws, losses):
+    """
+    Elo difference implied by a score, and the half width of its 95% confidence interval.  None
+    where it is infinite (no wins or no losses).
+    """
+    games = wins + draws + losses
+    if games == 0:
+        return None, None
+    score = (wins + draws / 2) / games
+    variance = (
+        wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score**2
+    ) / games
+    margin = 1.96 * math.sqrt(variance / games)
+
+    def elo(p):
+        if p <= 0 or p >= 1:
+            return None
+        return -400 * math.log10(1 / p - 1)
+
+    low, high = elo(score - margin), elo(score + margin)
+    return elo(score), None if low is None or high is None else (high - low) / 2
+
+
+def summarise(games, engine_a, engine_b):
+    """
+    Results from engine_a's point of view, plus speed statistics for both engines.
+    """
+    wins = draws = losses = 0
+    reasons = {}
+    for game in games:
+        reasons[game["reason"]] = reasons.get(game["reason"], 0) + 1
+        if game["result"] == "1/2-1/2":
+            draws += 1
+        elif (game["result"] == "1-0") == (game["white"] == engine_a["name"]):
+            wins += 1
+        else:
+            losses += 1
+    elo, error = elo_difference(wins, draws, losses)
+
+    speed = {}
+    for engine in (engine_a, engine_b):
+        nodes = sum(game["stats"][engine["name"]]["nodes"] for game in games)
+        seconds = sum(game["stats"][engine["name"]]["seconds"] for game in games)
+        moves = sum(game["stats"][engine["name"]]["moves"] for game in games)
+        speed[engine["name"]] = {
+            "nodes_per_second": nodes / seconds if seconds else 0,
+            "seconds_per_move": seconds / moves if moves else 0,
+            "nodes_per_move": nodes / moves if moves else 0,
+        }
+    return {
+        "games": len(games),
+        "wins": wins,
+        "draws": draws,
+        "losses": losses,
+        "score": (wins + draws / 2) / len(games) if games else None,
+        "elo": elo,
+        "elo_error_95": error,
+        "reasons": reasons,
+        "speed": speed,
+    }
+
+
+def run_tournament(engine_a, engine_b, games, processes, rules, seed):
+    """
+    Plays games (rounded up to an even number) between engine_a and engine_b.  Returns the summary
+    and the game records.
+    """
+    if engine_a["name"] == engine_b["name"]:
+        engine_b = dict(engine_b, name=engine_b["name"] + " (b)")
+    rng = random.Random(seed)
+    tasks = []
+    for pair in range((games + 1) // 2):
+        opening = random_opening(rng, rules["opening_plies"])
+        tasks.append((2 * pair, opening, engine_a, engine_b, rules))
+        tasks.append((2 * pair + 1, opening, engine_b, engine_a, rules))
+
+    records = []
+    with Pool(processes) as pool:
+        for game in pool.imap_unordered(play_game, tasks):
+            records.append(game)
+            print(
+                f"game {game['index'] + 1}/{len(tasks)}: {game['white']} - {game['black']}  {game['result']}  ({game['reason']}, {game['plies']} plies)",
+                flush=True,
+            )
+    records.sort(key=lambda game: game["index"])
+    return summarise(records, engine_a, engine_b), records
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Engine vs engine self-play tournament"
+    )
+    parser.add_argument("--a", default="", help="engine A settings, key=value,...")
+    parser.add_argument("--b", default="", help="engine B settings, key=value,...")
+    parser.add_argument(
+        "--config",
+        help='JSON file: {"engine_a": {...}, "engine_b": {...}, "rules": {...}}',
+    )
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument(
+        "--processes", type=int, default=None, help="default: one per CPU"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="opening randomisation seed"
+    )
+    parser.add_argument("--output", default="tournament_results.json")
+    args = parser.parse_args()
+
+    settings_a, settings_b, rules = args.a, args.b, dict(DEFAULT_RULES)
+    if args.config:
+        with open(args.config) as config_file:
+            config = json.load(config_file)
+        settings_a = config.get("engine_a", settings_a)
+        settings_b = config.get("engine_b", settings_b)
+        rules.update(config.get("rules", {}))
+    engine_a, engine_b = parse_engine(settings_a, "A"), parse_engine(settings_b, "B")
+
+    start_time = time.time()
+    summary, records = run_tournament(
+        engine_a, engine_b, args.games, args.processes, rules, args.seed
+    )
+    summary["seconds"] = time.time() - start_time
+    with open(args.output, "w") as output_file:
+        json.dump(
+            {
+                "engine_a": engine_a,
+                "engine_b": engine_b,
+                "rules": rules,
+                "seed": args.seed,
+                "summary": summary,
+                "games": records,
+            },
+            output_file,
+            indent=2,
+        )
+
+    if not summary["games"]:
+        print(f"no games played, results written to {args.output}")
+        return
+    if summary["elo"] is None:
+        elo = "+inf" if summary["score"] > 0.5 else "-inf"
+    else:
+        elo = f"{summary['elo']:+.0f}"
+    error = (
+        "inf" if summary["elo_error_95"] is None else f"{summary['elo_error_95']:.0f}"
+    )
+    print()
+    print(
+        f"{engine_a['name']} vs {engine_b['name']}:  +{summary['wins']} ={summary['draws']} -{summary['losses']}     score: {summary['score']:.3f}     elo: {elo} +/- {error}"
+    )
+    for name, speed in summary["speed"].items():
+        print(
+            f"{name}:  nps: {speed['nodes_per_second']:.0f}     time per move: {speed['seconds_per_move']:.2f}s     nodes per move: {speed['nodes_per_move']:.0f}"
+        )
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+from array import array
+
+EXACT = 0  # score is the exact negamax score of the position
+LOWER_BOUND = 1  # search failed high (beta cutoff): the real score is >= score
+UPPER_BOUND = 2  # search failed low: the real score is <= score
+
+NO_MOVE = 0
+# bytes per entry, from the item sizes of the arrays below: key, score, move, depth, flag, age
+ENTRY_SIZE = sum(array(typecode).itemsize for typecode in "QdIbBB")
+
+
+class TranspositionTable:
+    """
+    Fixed-size hash table of search results keyed on GameState.zobrist_key.  Entries live in
+    flat typed arrays so the memory used is fixed by size_mb and known up front.
+
+    Replacement is depth-preferred: an entry is only overwritten by a search of the same
+    position, an entry from an older search (see new_search), or a search at least as deep.
+    """
+
+    def __init__(self, size_mb=64):
+        self.size_mb = size_mb
+        self.num_entries = max(1, int(size_mb * 1024 * 1024) // ENTRY_SIZE)
+        self.keys = array("Q", [0]) * self.num_entries
+        self.scores = array("d", [0.0]) * self.num_entries
+        self.moves = array("I", [NO_MOVE]) * self.num_entries  # packed moves, 26 bits
+        self.depths = array("b", [-1]) * self.num_entries  # -1 == empty slot
+        self.flags = array("B", [EXACT]) * self.num_entries
+        self.ages = array("B", [0]) * self.num_entries
+        self.age = 0
+        self.probes, self.hits = 0, 0
+
+    def new_search(self):
+        """
+        Called at the start of every search so entries from earlier searches can be replaced.
+        """
+        self.age = (self.age + 1) % 256
+
+    def clear(self):
+        self.__init__(self.size_mb)
+
+    def probe(self, key):
+        """
+        Returns (depth, flag, score, move) stored for key, or None if the position isn't in the table.
+        """
+        self.probes += 1
+        index = key % self.num_entries
+        if self.keys[index] != key or self.depths[index] < 0:
+            return None
+        self.hits += 1
+        return (
+            self.depths[index],
+            self.flags[index],
+            self.scores[index],
+            self.moves[index],
+        )
+
+    def store(self, key, depth, flag, score, move=NO_MOVE):
+        """
+        Stores a search result, unless the slot holds a deeper search of another position from this search.
+        """
+        index = key % self.num_entries
+        if (
+            self.keys[index] == key
+            or self.ages[index] != self.age
+            or depth >= self.depths[index]
+        ):
+            if move == NO_MOVE and self.keys[index] == key:
+                move = self.moves[index]  # keep the old best move rather than losing it
+            self.keys[index] = key
+            self.depths[index] = depth
+            self.flags[index] = flag
+            self.scores[index] = score
+            self.moves[index] = move
+            self.ages[index] = self.age
@@ -0,0 +1,261 @@
+"""
+UCI (Universal Chess Interface) driver: runs the engine without pygame, reading commands on stdin
+and answering on stdout, so it can run on a server or be added to a GUI or tournament manager as
+a UCI engine.
+
+    python uci.py
+
+Supports uci, isready, ucinewgame, setoption (Hash, BookFile, TablebaseDir), position (startpos / fen, with moves),
+go (wtime, btime, winc, binc, movestogo, movetime, depth, nodes, infinite), stop and quit.
+The search runs single process in a background thread so stop can interrupt it.  GameState only
+promotes to a queen, so under-promotions in a position command are played as queen promotions.
+"""
+
+import os
+import sys
+import threading
+
+from bitboard_game_state import BitboardGameState
+from chess_ai import Searcher, mate_plies
+from fen import START_FEN
+from opening_book import OpeningBook
+from move import Move
+
+ENGINE_NAME = "chess-python"
+ENGINE_AUTHOR = "edwardh273"
+MAX_DEPTH = 32  # depth limit for go infinite / go with only a time limit
+MOVES_TO_GO = 30  # wtime/btime with no movestogo: assume this many moves are left
+MOVE_OVERHEAD = 0.05  # seconds kept back per move for communication
+
+
+def uci_notation(move):
+    return Move.from_packed(move).get_uci_notation()
+
+
+def send(line):
+    print(line, flush=True)
+
+
+class UciEngine:
+    """
+    Holds the position set by the last position command, the Searcher, which keeps its tables for
+    the whole game, and the search thread, if one is running.
+    """
+
+    def __init__(self):
+        self.gs = BitboardGameState()
+        self.search_thread = None
+        # go infinite: the search thread holds its bestmove until stop sets this
+        self.stop_event = threading.Event()
+        self.infinite = False
+        # stop can only interrupt a search running in this process
+        self.searcher = Searcher(search_processes=1, info_callback=self.send_info)
+
+    def handle(self, line):
+        """
+        Handles one command line.  Returns False for quit.
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            send(f"id name {ENGINE_NAME}")
+            send(f"id author {ENGINE_AUTHOR}")
+            send(
+                f"option name Hash type spin default {self.searcher.tt_size_mb} min 1 max 4096"
+            )
+            send("option name BookFile type string default <empty>")
+            send("option name TablebaseDir type string default <empty>")
+            send("uciok")
+        elif command == "isready":
+            send("readyok")
+        elif command == "ucinewgame":
+            self.stop()
+            self.searcher.new_game()
+            self.gs = BitboardGameState()
+        elif command == "setoption":
+            self.set_option(args)
+        elif command == "position":
+            self.stop()
+            self.set_position(args)
+        elif command == "go":
+            self.stop()
+            self.go(args)
+        elif command == "stop":
+            self.stop()
+        elif command == "quit":
+            self.stop()
+            return False
+        return True
+
+    def set_option(self, args):
+        """
+        setoption name <name> value <value>.  Hash sets the transposition table megabytes, BookFile
+        the Polyglot opening book and TablebaseDir the endgame tables directory (<empty> for none).
+        """
+        if "name" not in args or "value" not in args:
+            return
+        name = " ".join(args[args.index("name") + 1 : args.index("value")])
+        value = " ".join(args[args.index("value") + 1 :])
+        if name.lower() == "hash":
+            try:
+                self.searcher.set_transposition_table_size(max(1, int(value)))
+            except ValueError:
+                send(f"info string invalid Hash value {value}")
+        elif name.lower() == "bookfile":
+            if value in ("", "<empty>"):
+                self.searcher.book_file = None
+                return
+            try:
+                self.searcher.opening_book = OpeningBook(value)
+            except OSError as error:
+                send(f"info string can't open book {value}: {error}")
+                return
+            self.searcher.book_file = value
+        elif name.lower() == "tablebasedir":
+            if value in ("", "<empty>"):
+                self.searcher.tablebase_dir = None
+            elif os.path.isdir(value):
+                self.searcher.tablebase_dir = value
+            else:
+                send(f"info string no tablebase directory {value}")
+
+    def set_position(self, args):
+        """
+        position startpos [moves ...] / position fen <fen> [moves ...]
+        """
+        if "moves" in args:
+            moves = args[args.index("moves") + 1 :]
+            args = args[: args.index("moves")]
+        else:
+            moves = []
+        if args and args[0] == "fen":
+            fen = " ".join(args[1:])
+        else:
+            fen = START_FEN
+        try:
+            self.gs = BitboardGameState(fen)
+        except ValueError as error:
+            send(f"info string {error}")
+            return
+        for notation in moves:
+            valid_moves = {
+                uci_notation(move): move for move in self.gs.get_valid_moves()
+            }
+            if len(notation) == 5:
+                notation = notation[:4] + "q"  # only queen promotions are generated
+            if notation not in valid_moves:
+                send(f"info string illegal move {notation}")
+                return
+            self.gs.make_move(valid_moves[notation])
+
+    def go(self, args):
+        """
+        Sets the search limits from the go arguments and starts searching in a background thread.
+        """
+        limits = {}
+        for i in range(len(args) - 1):
+            if args[i] in (
+                "wtime",
+                "btime",
+                "winc",
+                "binc",
+                "movestogo",
+                "movetime",
+                "depth",
+                "nodes",
+            ):
+                try:
+                    limits[args[i]] = int(args[i + 1])
+                except ValueError:
+                    pass
+
+        time_limit = None
+        if "movetime" in limits:
+            time_limit = limits["movetime"] / 1000
+        else:
+            time_left = limits.get("wtime" if self.gs.white_to_move else "btime")
+            increment = limits.get("winc" if self.gs.white_to_move else "binc", 0)
+            if time_left is not None:
+                moves_to_go = limits.get("movestogo", MOVES_TO_GO)
+                time_limit = (
+                    min(
+                        time_left / max(moves_to_go, 1) + increment / 2,
+                        time_left / 2,
+                    )
+                    / 1000
+                )
+        if "infinite" in args:
+            time_limit = None
+        if time_limit is not None:
+            time_limit = max(time_limit - MOVE_OVERHEAD, 0.01)
+
+        depth = max(1, min(limits.get("depth", MAX_DEPTH), MAX_DEPTH))
+        searcher = self.searcher
+        searcher.white_depth = searcher.black_depth = depth
+        searcher.white_time_limit = searcher.black_time_limit = time_limit
+        searcher.max_nodes = limits.get("nodes")
+
+        self.infinite = "infinite" in args
+        self.stop_event.clear()
+        self.search_thread = threading.Thread(target=self.search, daemon=True)
+        self.search_thread.start()
+
+    def search(self):
+        """
+        Search thread: runs find_best_move and sends bestmove.  After go infinite the bestmove waits
+        for stop, even if the search ends first (a found mate, a book or tablebase move).
+        """
+        valid_moves = self.gs.get_valid_moves()
+        if not valid_moves:
+            best_move_text = "0000"
+        else:
+            best_move = self.searcher.find_best_move(self.gs, valid_moves)
+            if best_move is None:  # stopped during depth 1, or every move gets mated
+                best_move = (
+                    self.searcher.next_move
+                    if self.searcher.next_move is not None
+                    else valid_moves[0]
+                )
+            best_move_text = uci_notation(best_move)
+        if self.infinite:
+            self.stop_event.wait()
+        send(f"bestmove {best_move_text}")
+
+    def stop(self):
+        """
+        Stops the search, if one is running, and waits for it to send its bestmove.
+        """
+        while self.search_thread is not None and self.search_thread.is_alive():
+            self.stop_event.set()
+            self.searcher.stop()
+            self.search_thread.join(0.05)
+        self.search_thread = None
+
+    def send_info(self, depth, score, nodes, seconds, pv):
+        """
+        Searcher.info_callback: an info line for every completed iteration.  score is in pawns
+        from the side to move's point of view.
+        """
+        plies = mate_plies(score)
+        if plies is not None:  # mate in moves, negative when being mated
+            score_text = f"mate {(plies + 1) // 2 if plies > 0 else plies // 2}"
+        else:
+            score_text = f"cp {round(score * 100)}"
+        send(
+            f"info depth {depth} score {score_text} nodes {nodes} nps {int(nodes / max(seconds, 1e-3))} "
+            f"time {int(seconds * 1000)} pv {' '.join(uci_notation(move) for move in pv)}"
+        )
+
+
+def main():
+    engine = UciEngine()
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    engine.stop()
+
+
+if __name__ == "__main__":
+    main()
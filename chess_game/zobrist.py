@@ -0,0 +1,45 @@
+import random
+
+# Zobrist keys.  Every (piece, square), castle right, en passant file and the side to move gets a
+# random 64-bit number.  The hash of a position is the XOR of the keys of everything in it, so
+# make_move/undo_move can update it by XORing in and out only what a move changes.
+PIECES = ["wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK"]
+
+_rng = random.Random(20240521)  # fixed seed so hashes are the same in every process
+
+piece_keys = {
+    piece: [[_rng.getrandbits(64) for col in range(8)] for row in range(8)]
+    for piece in PIECES
+}  # piece_keys["wK"][row][col]
+
+castle_keys = [_rng.getrandbits(64) for i in range(4)]  # bits of WKS, BKS, WQS, BQS
+enpassant_keys = [
+    _rng.getrandbits(64) for col in range(8)
+]  # indexed by the en passant column
+black_to_move_key = _rng.getrandbits(64)
+
+# XOR of the castle keys for every combination of rights, indexed by GameState.castle_rights
+castle_rights_keys = [0] * 16
+for index in range(16):
+    for bit in range(4):
+        if index & (1 << bit):
+            castle_rights_keys[index] ^= castle_keys[bit]
+
+
+def hash_position(gs):
+    """
+    Computes the Zobrist hash of a GameState from scratch.  GameState keeps its hash up to date
+    incrementally, this is used to initialise it and to check the incremental hash.
+    """
+    key = 0
+    for row in range(8):
+        for col in range(8):
+            square = gs.board[row][col]
+            if square != "--":
+                key ^= piece_keys[square][row][col]
+    key ^= castle_rights_keys[gs.castle_rights]
+    if gs.enpassant_possible != ():
+        key ^= enpassant_keys[gs.enpassant_possible[0]]
+    if not gs.white_to_move:
+        key ^= black_to_move_key
+    return key